@@ -1,5 +1,8 @@
+import logging
 import yaml
 import os
+import re
+from functools import lru_cache
 
 
 def replace_env_variables(config):
@@ -10,6 +13,8 @@ def replace_env_variables(config):
         config = [replace_env_variables(item) for item in config]
     elif isinstance(config, str) and config.startswith('${') and config.endswith('}'):
         env_var = config.strip('${}')
+        if env_var == 'index' or env_var.startswith('each.'):
+            return config  # Fleet placeholders are filled in by iter_resources()
         return os.getenv(env_var, config)  # Replace with env var or keep original
     return config
 
@@ -18,9 +23,93 @@ def load_yaml(file_path):
         config = yaml.safe_load(file)
     return replace_env_variables(config)
 
+def _interpolate(value, index, key, each):
+    """Fill ${index}, ${each.key} and ${each.value} placeholders in a (nested) value."""
+    if isinstance(value, dict):
+        return {k: _interpolate(v, index, key, each) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_interpolate(v, index, key, each) for v in value]
+    if isinstance(value, str):
+        if value == '${each.value}':
+            return each  # Keep non-string values (lists, dicts, numbers) intact
+        return (value.replace('${index}', str(index))
+                     .replace('${each.key}', str(key))
+                     .replace('${each.value}', str(each)))
+    return value
+
+
+def iter_resources(resources):
+    """Yield resources with ``count`` / ``for_each`` expanded into one entry per member.
+
+    ``count: N`` yields N members numbered from 0; ``for_each`` takes a list
+    (each item is both key and value) or a mapping. Names and properties may
+    use ``${index}``, ``${each.key}`` and ``${each.value}``; a name without a
+    placeholder gets ``-<index>`` or ``-<key>`` appended. Members carry
+    ``fleet: <name>`` so plan and state can treat them as a group; that is
+    ``fleet`` from the resource if set, otherwise its name with the
+    placeholders removed (``web-${index}`` -> ``web``), or its type if
+    nothing is left. Members are produced
+    one at a time as the caller iterates.
+    """
+    for resource in resources or []:
+        if 'count' not in resource and 'for_each' not in resource:
+            yield resource
+            continue
+        base = {k: v for k, v in resource.items() if k not in ('count', 'for_each')}
+        if 'for_each' in resource:
+            for_each = resource['for_each'] or []
+            members = for_each.items() if isinstance(for_each, dict) else ((item, item) for item in for_each)
+        else:
+            members = ((i, i) for i in range(int(resource['count'] or 0)))
+        name = str(resource.get('name'))
+        fleet = str(resource.get('fleet') or _fleet_name(name) or resource.get('type'))
+        for index, (key, each) in enumerate(members):
+            member = _interpolate(base, index, key, each)
+            if member.get('name') == name:
+                member['name'] = f"{name}-{key}"
+            member['fleet'] = fleet
+            yield member
+
+
+def _fleet_name(name):
+    """Logical fleet name: the resource name without ${...} placeholders or the separators around them."""
+    return re.sub(r'([-_.])[-_.]+', r'\1', re.sub(r'\$\{[^}]*\}', '', name)).strip('-_.')
+
+
+def fleet_marker(resource_config):
+    """Return the state keys that tie a resource to its fleet ({} for standalone resources)."""
+    return {'fleet': resource_config['fleet']} if resource_config.get('fleet') else {}
+
+
+@lru_cache(maxsize=None)
+def read_user_data(file_path):
+    """Read a user_data file once per run, however many fleet members use it."""
+    with open(file_path, 'r') as file:
+        return file.read()
+
+
+# Workers used for concurrent API calls when neither --parallelism nor PYRAFORM_PARALLELISM is set.
+DEFAULT_PARALLELISM = 10
+
+
+def resolve_parallelism(value=None):
+    """Return the worker count from an explicit value, PYRAFORM_PARALLELISM, or the default."""
+    value = value or os.getenv('PYRAFORM_PARALLELISM') or DEFAULT_PARALLELISM
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        logging.getLogger(__name__).warning(f"Invalid parallelism '{value}', using {DEFAULT_PARALLELISM}")
+        return DEFAULT_PARALLELISM
+
+
 def load_infrastructure_config(file_path: str | None = None):
     path = file_path or os.getenv('PYRAFORM_INFRA', 'infrastructure.yml')
-    return load_yaml(path)
+    config = load_yaml(path)
+    if isinstance(config, dict) and 'resources' in config:
+        # Deploy, plan and destroy index members by position in a dependency graph and look them up by
+        # name, so every consumer needs the whole list; expand it once here rather than per consumer.
+        config['resources'] = list(iter_resources(config['resources']))
+    return config
 
 def load_user_settings(file_path: str | None = None):
     path = file_path or os.getenv('PYRAFORM_SETTINGS', 'settings.yml')
@@ -10,9 +10,13 @@ logger = logging.getLogger(__name__)
 
 
 def plan(provider, filter_action: str | None = None):
-    state = load_state()  # Load current deployment state
     user_settings = load_user_settings()
     infrastructure_config = load_infrastructure_config()
+    # Load current deployment state; a regular plan only needs the configured types
+    if filter_action == 'destroy':
+        state = load_state()
+    else:
+        state = load_state(types={str(r.get('type', '')) for r in infrastructure_config['resources']})
 
     logger.info(f"{Fore.CYAN}Planning deployment...{Style.RESET_ALL}")
     logger.debug(f"User settings: {user_settings}")
@@ -23,9 +27,13 @@ def plan(provider, filter_action: str | None = None):
 
     # Special destroy-focused plan: list state resources that will be destroyed
     if filter_action == 'destroy':
-        for res in state.get('resources', []):
-            table.append([res.get('name'), res.get('type'), f"{Fore.RED}destroy{Style.RESET_ALL}", "from state"])
+        fleet_rows = {}
+        for res in state.resources:
             actions["destroy"] += 1
+            if res.get('fleet'):
+                _add_fleet_row(table, fleet_rows, res, f"{Fore.RED}destroy{Style.RESET_ALL}", "from state")
+                continue
+            table.append([res.get('name'), res.get('type'), f"{Fore.RED}destroy{Style.RESET_ALL}", "from state"])
         headers = ["Name", "Type", "Action", "Details"]
         logger.info("\n" + tabulate(table, headers, tablefmt="pretty"))
         logger.info(f"\nPlan: {actions['destroy']} to destroy.")
@@ -66,9 +74,10 @@ def plan(provider, filter_action: str | None = None):
         ct = (cfg_type or '').lower()
         return st == ct or st.endswith(f"_{ct}")
 
+    fleet_rows = {}
     for resource in infrastructure_config['resources']:
-        existing_resource = next((res for res in state.get('resources', [])
-                                  if res.get('name') == resource.get('name') and _type_matches(str(res.get('type', '')), str(resource.get('type', '')))), None)
+        existing_resource = next((res for res in state.named(resource.get('name'))
+                                  if _type_matches(str(res.get('type', '')), str(resource.get('type', '')))), None)
         
         if existing_resource:
             def pretty(val):
@@ -82,7 +91,11 @@ def plan(provider, filter_action: str | None = None):
 
             differences = {}
             desired_props = resource.get('properties') or {}
-            current_props = (existing_resource.get('properties') or {})
+            # Blob references compare by hash; only changed values are read back for display
+            current_props = {
+                k: (desired_props[k] if k in desired_props and state.blobs.matches(v, desired_props[k]) else state.blobs.resolve(v))
+                for k, v in (existing_resource.get('properties') or {}).items()
+            }
 
             # Ignore ephemeral/computed fields in diffs
             generic_ignored = {
@@ -216,6 +229,9 @@ def plan(provider, filter_action: str | None = None):
                 return str(val)
             diff_display = ", ".join([f"{k}: {Fore.GREEN}{pretty(v)}{Style.RESET_ALL}" for k, v in (resource.get('properties') or {}).items()])
         
+        if resource.get('fleet'):
+            _add_fleet_row(table, fleet_rows, resource, status, diff_display)
+            continue
         table.append([resource['name'], resource['type'], status, diff_display])
 
     headers = ["Name", "Type", "Action", "Details"]
@@ -224,6 +240,23 @@ def plan(provider, filter_action: str | None = None):
     extra = f", {actions['recreate']} require recreate" if actions.get('recreate') else ""
     logger.info(f"\nPlan: {actions['create']} to add, {actions['update']} to change, {actions['no_change']} unchanged{extra}.")
 
+def _add_fleet_row(table, fleet_rows, resource, status, details):
+    """Fold a count/for_each member into one table row per fleet and action.
+
+    Members with identical details share them; otherwise the row lists the
+    member names.
+    """
+    key = (resource.get('fleet'), str(resource.get('type', '')).lower(), status)
+    group = fleet_rows.get(key)
+    if group is None:
+        group = fleet_rows[key] = {'row': [], 'names': [], 'details': set()}
+        table.append(group['row'])
+    group['names'].append(resource.get('name'))
+    group['details'].add(details)
+    shown = next(iter(group['details'])) if len(group['details']) == 1 else f"members: {', '.join(group['names'])}"
+    group['row'][:] = [f"{resource.get('fleet')} ({len(group['names'])} members)", resource.get('type'), status, shown]
+
+
 def confirm_action(prompt):
     """Ask user to confirm the action."""
     response = input(f"{Fore.YELLOW}{prompt} [y/n]: {Style.RESET_ALL}").lower()
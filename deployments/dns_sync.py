@@ -0,0 +1,146 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config_loader import resolve_parallelism
+
+logger = logging.getLogger(__name__)
+
+# Fields compared (besides type/name/data) when deciding whether a matched record needs an update.
+COMPARED_FIELDS = ('ttl', 'priority', 'port', 'weight', 'flags', 'tags')
+
+# Record types whose data is a hostname (compared case-insensitively, trailing dot ignored).
+HOSTNAME_TYPES = ('CNAME', 'MX', 'NS', 'SRV', 'PTR', 'ALIAS')
+
+
+def normalize_name(name, domain):
+    """Return a record name relative to its domain, with '@' for the apex."""
+    name = str(name or '').rstrip('.').lower()
+    domain = str(domain or '').rstrip('.').lower()
+    if name in ('', '@', domain):
+        return '@'
+    if domain and name.endswith(f".{domain}"):
+        return name[:-len(domain) - 1]
+    return name
+
+
+def normalize_data(record_type, data):
+    data = str(data if data is not None else '')
+    if record_type in HOSTNAME_TYPES:
+        return data.rstrip('.').lower()
+    return data
+
+
+def identity(record, domain):
+    """Match key for a record: (type, name, data)."""
+    record_type = str(record.get('type', '')).upper()
+    return record_type, normalize_name(record.get('name'), domain), normalize_data(record_type, record.get('data'))
+
+
+def diff_records(domain, desired, current, known_ids=None, managed_ids=()):
+    """Compare desired records with the records that exist in a domain.
+
+    :param domain: Domain name, used to normalize record names.
+    :param desired: Dict of key -> record dict (type, name, data and optional ttl, priority, ...).
+    :param current: List of record dicts as returned by the provider, each with an 'id'.
+    :param known_ids: Dict of key -> record ID remembered in state; lets a record whose
+        data changed be updated in place instead of recreated.
+    :param managed_ids: Record IDs pyraform manages. Only these are ever deleted.
+    :return: Dict with 'create' [(key, desired)], 'update' [(key, desired, current)],
+        'unchanged' [(key, current)] and 'delete' [current].
+    """
+    known_ids = {key: str(value) for key, value in (known_ids or {}).items() if value is not None}
+    by_identity = {}
+    by_id = {}
+    for record in current:
+        by_identity.setdefault(identity(record, domain), []).append(record)
+        by_id[str(record.get('id'))] = record
+
+    result = {'create': [], 'update': [], 'unchanged': [], 'delete': []}
+    matched = set()
+    pending = []
+    for key, record in desired.items():
+        candidates = [r for r in by_identity.get(identity(record, domain), []) if str(r.get('id')) not in matched]
+        # Prefer the record state already points at, then any identical unclaimed record
+        existing = next((r for r in candidates if str(r.get('id')) == known_ids.get(key)), None) \
+            or (candidates[0] if candidates else None)
+        if existing is None:
+            pending.append((key, record))
+            continue
+        matched.add(str(existing.get('id')))
+        if any(field in record and record[field] != existing.get(field) for field in COMPARED_FIELDS):
+            result['update'].append((key, record, existing))
+        else:
+            result['unchanged'].append((key, existing))
+
+    for key, record in pending:
+        existing = by_id.get(known_ids.get(key))
+        if existing is not None and str(existing.get('id')) not in matched:
+            matched.add(str(existing.get('id')))
+            result['update'].append((key, record, existing))
+        else:
+            result['create'].append((key, record))
+
+    managed = {str(record_id) for record_id in managed_ids}
+    result['delete'] = [r for r in current if str(r.get('id')) in managed and str(r.get('id')) not in matched]
+    return result
+
+
+def apply_diff(diff, create_fn, update_fn, delete_fn, parallelism=None):
+    """Run the writes of a diff concurrently.
+
+    ``create_fn(record)`` and ``update_fn(record, current)`` return the record ID;
+    ``delete_fn(current)`` returns nothing. Failures are logged per record.
+
+    :return: (ids, deleted): key -> record ID for every desired record that now
+        exists, and the IDs that were deleted.
+    """
+    ids = {key: current.get('id') for key, current in diff['unchanged']}
+
+    def _create(item):
+        key, record = item
+        return 'create', key, create_fn(record)
+
+    def _update(item):
+        key, record, current = item
+        return 'update', key, update_fn(record, current)
+
+    def _delete(current):
+        delete_fn(current)
+        return 'delete', None, current.get('id')
+
+    jobs = [(_create, item) for item in diff['create']] \
+        + [(_update, item) for item in diff['update']] \
+        + [(_delete, item) for item in diff['delete']]
+    deleted = []
+    if not jobs:
+        return ids, deleted
+
+    def _run(job):
+        fn, item = job
+        try:
+            return fn(item)
+        except Exception as e:
+            logger.error(f"DNS record {fn.__name__.strip('_')} failed for {item[0] if isinstance(item, tuple) else item.get('id')}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=resolve_parallelism(parallelism)) as pool:
+        for outcome in pool.map(_run, jobs):
+            if outcome is None:
+                continue
+            action, key, record_id = outcome
+            if action == 'delete':
+                deleted.append(record_id)
+            elif record_id is not None:
+                ids[key] = record_id
+    return ids, deleted
+
+
+def adopt(diff):
+    """Return key -> record ID for desired records that already exist, without writing anything."""
+    ids = {key: current.get('id') for key, current in diff['unchanged']}
+    ids.update({key: current.get('id') for key, _, current in diff['update']})
+    return ids
+
+
+def summarize(diff):
+    return ', '.join(f"{len(diff[action])} {action}" for action in ('create', 'update', 'delete', 'unchanged'))
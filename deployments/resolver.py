@@ -0,0 +1,62 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Resolver:
+    """Resolves references between resources (name -> provider ID) for one run.
+
+    Each reference kind is registered with the state type and property that
+    hold its ID, plus an optional lister returning ``{name: id}`` for
+    everything that exists at the provider. ``resolve()`` answers from state
+    first; handlers record every resource they create there, so references
+    to resources created earlier in the run resolve without API calls. Only
+    names missing from state fall back to the lister, which runs at most
+    once per kind per run.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self._kinds = {}
+        self._listings = {}
+        # One lock per kind, so a slow listing only blocks lookups of the same kind
+        self._locks = {}
+
+    def register(self, kind, state_type, id_key, lister=None):
+        self._kinds[kind] = (state_type, id_key, lister)
+        self._locks[kind] = threading.Lock()
+        return self
+
+    def resolve(self, kind, name):
+        """Return the ID for ``name``, or None if it cannot be found."""
+        if name is None:
+            return None
+        state_type, id_key, lister = self._kinds[kind]
+        resource_id = self.state.id_of(name, state_type, id_key)
+        if resource_id is not None:
+            return resource_id
+        if lister is None:
+            return None
+        return self._listing(kind, lister).get(name)
+
+    def resolve_all(self, kind, names):
+        """Resolve several names, logging and skipping the ones that are unknown."""
+        ids = []
+        for name in names or []:
+            resource_id = self.resolve(kind, name)
+            if resource_id is None:
+                logger.warning(f"Could not resolve {kind} '{name}'")
+                continue
+            ids.append(resource_id)
+        return ids
+
+    def _listing(self, kind, lister):
+        with self._locks[kind]:
+            if kind not in self._listings:
+                try:
+                    self._listings[kind] = dict(lister())
+                except Exception as e:
+                    logger.error(f"Failed to list {kind} resources: {e}")
+                    self._listings[kind] = {}
+            return self._listings[kind]
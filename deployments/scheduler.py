@@ -0,0 +1,198 @@
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from config_loader import resolve_parallelism
+from state.state_manager import REFERENCE_KEYS, STATE_REFERENCE_KEYS, STATE_ID_REFERENCES
+
+logger = logging.getLogger(__name__)
+
+# Resource types that can also be referenced by their properties['name'] (e.g. DNS records -> domain).
+ALIASED_TYPES = ('domain', 'dns_domain')
+
+# Keys naming a group a resource joins, where the group may also list its members
+# (Vultr instance ``firewall`` vs firewall ``instances``). When both sides reference
+# each other, the member's edge is dropped: the group attaches its members once
+# they exist, so members are applied first.
+BACK_REFERENCE_KEYS = ('firewall',)
+
+
+def references(properties, keys=REFERENCE_KEYS):
+    """Yield resource names referenced by a properties dict."""
+    for key in keys:
+        value = (properties or {}).get(key)
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if isinstance(item, str):
+                    yield item
+
+
+def build_graph(resources, keys=REFERENCE_KEYS):
+    """Return, per resource index, the set of indexes it depends on.
+
+    Edges come from cross-resource references in ``properties``; names that
+    do not match any resource in the list are ignored (they may already exist
+    in the account or in state). Mutual references through
+    ``BACK_REFERENCE_KEYS`` keep only the group -> member edge.
+    """
+    by_name = {}
+    for i, res in enumerate(resources):
+        by_name.setdefault(res.get('name'), []).append(i)
+        props = res.get('properties') or {}
+        if str(res.get('type', '')).lower() in ALIASED_TYPES and props.get('name') not in (None, res.get('name')):
+            by_name.setdefault(props['name'], []).append(i)
+
+    deps = [set() for _ in resources]
+    back = set()
+    for i, res in enumerate(resources):
+        for key in keys:
+            for ref in references(res.get('properties'), (key,)):
+                for j in by_name.get(ref, ()):
+                    if j != i:
+                        deps[i].add(j)
+                        if key in BACK_REFERENCE_KEYS:
+                            back.add((i, j))
+    for i, j in back:
+        if i in deps[j] and (j, i) not in back:
+            deps[i].discard(j)
+    return deps
+
+
+def build_state_graph(state, resources):
+    """Like build_graph(), for resources read back from state.
+
+    Besides name references, follows provider IDs recorded at apply time
+    (volume ``attached_to``, firewall/LB ``droplet_ids``, disk ``attached_to_vm``)
+    through the state's ID index.
+    """
+    deps = build_graph(resources, STATE_REFERENCE_KEYS)
+    position = {id(res): i for i, res in enumerate(resources)}
+    for i, res in enumerate(resources):
+        props = res.get('properties') or {}
+        for key, id_key in STATE_ID_REFERENCES.items():
+            values = props.get(key)
+            for value in values if isinstance(values, list) else [values]:
+                target = state.find_by_id(id_key, value)
+                j = position.get(id(target))
+                if j is not None and j != i:
+                    deps[i].add(j)
+    return deps
+
+
+def recorded(state):
+    """run_graph() ``check`` for deploys: an item failed if nothing under its name is in state."""
+    return lambda item: bool(state.named(item.get('name')))
+
+
+def removed(state):
+    """run_graph() ``check`` for teardown: an item failed if it is still in state."""
+    return lambda item: state.find(item.get('name'), item.get('type')) is None
+
+
+def run_graph(items, deps, apply_fn, parallelism=None, reverse=False, check=None):
+    """Apply ``apply_fn`` to every item, running independent items concurrently.
+
+    An item starts once everything it depends on has finished (or, with
+    ``reverse=True``, once everything depending on it has finished, which is
+    the order needed for teardown). Ready items start in list order.
+
+    An item fails when ``apply_fn`` raises or returns False, or when
+    ``check(item)`` is false afterwards. Everything that transitively waits on
+    a failed item is skipped and reported; unrelated items still run. When
+    only a dependency cycle is left, the cycle is logged and its first member
+    in list order is started, after which the rest follow the graph.
+
+    Returns ``(failed, skipped)``, both lists of items in list order.
+    """
+    parallelism = resolve_parallelism(parallelism)
+    if reverse:
+        inverted = [set() for _ in items]
+        for i, ds in enumerate(deps):
+            for j in ds:
+                inverted[j].add(i)
+        deps = inverted
+
+    waiting = {i: set(ds) for i, ds in enumerate(deps) if ds}
+    ready = [i for i, ds in enumerate(deps) if not ds]
+    heapq.heapify(ready)
+    dependents = [set() for _ in items]
+    for i, ds in enumerate(deps):
+        for j in ds:
+            dependents[j].add(i)
+
+    def _run(i):
+        try:
+            if apply_fn(items[i]) is False:
+                return False
+        except Exception as e:
+            logger.error(f"Unhandled error applying '{items[i].get('name')}': {e}")
+            return False
+        return check is None or bool(check(items[i]))
+
+    def _name(i):
+        return str(items[i].get('name'))
+
+    failed, skipped = set(), set()
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        running = {}
+        while ready or waiting or running:
+            while ready and len(running) < parallelism:
+                i = heapq.heappop(ready)
+                running[pool.submit(_run, i)] = i
+            if not running:
+                cycle = _find_cycle(waiting)
+                first = min(cycle)
+                logger.warning(f"Dependency cycle: {' -> '.join(_name(i) for i in cycle + cycle[:1])}; applying '{_name(first)}' first")
+                del waiting[first]
+                heapq.heappush(ready, first)
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                if not future.result():
+                    failed.add(i)
+                    blocked = _skip_dependents(i, dependents, waiting)
+                    if blocked:
+                        skipped.update(blocked)
+                        logger.warning(f"Skipping {', '.join(_name(d) for d in sorted(blocked))}: '{_name(i)}' failed")
+                    continue
+                for d in dependents[i]:
+                    if d in waiting:
+                        waiting[d].discard(i)
+                        if not waiting[d]:
+                            del waiting[d]
+                            heapq.heappush(ready, d)
+
+    if failed or skipped:
+        logger.error(f"{len(failed)} resource(s) failed, {len(skipped)} skipped because of them")
+    return [items[i] for i in sorted(failed)], [items[i] for i in sorted(skipped)]
+
+
+def _skip_dependents(i, dependents, waiting):
+    """Drop everything still waiting that transitively depends on item i; returns the dropped indexes."""
+    blocked = set()
+    stack = [i]
+    while stack:
+        for d in dependents[stack.pop()]:
+            if d in waiting:
+                del waiting[d]
+                blocked.add(d)
+                stack.append(d)
+    return blocked
+
+
+def _find_cycle(waiting):
+    """Return one dependency cycle (list of indexes) among the waiting items.
+
+    Only called when nothing is ready or running, so every waiting item
+    still waits on another waiting item.
+    """
+    path, seen = [], {}
+    i = min(waiting)
+    while i not in seen:
+        seen[i] = len(path)
+        path.append(i)
+        i = min(waiting[i])
+    return path[seen[i]:]
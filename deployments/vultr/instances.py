@@ -1,8 +1,9 @@
 import argparse
 import logging
-from config_loader import load_infrastructure_config, load_user_settings
-from state.state_manager import load_state, update_state
+from config_loader import load_infrastructure_config, load_user_settings, fleet_marker, resolve_parallelism
+from state.state_manager import load_state, update_state, save_state
 from providers.vultr import VultrProvider
+from deployments.scheduler import build_state_graph, run_graph, removed
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +19,7 @@ def deploy():
         logger.error("Vultr API key not found in settings.yml under vultr_credentials.api_key")
         return
 
-    vp = VultrProvider(api_key)
+    vp = VultrProvider(api_key, per_page=creds.get('per_page', 100))
 
     for res in infra.get('resources', []):
         rtype = str(res.get('type', '')).lower()
@@ -27,7 +28,7 @@ def deploy():
         name = res.get('name')
         props = res.get('properties', {})
 
-        existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_instance' and r.get('name') == name), None)
+        existing = state.find(name, 'vultr_instance')
         if existing and existing.get('properties', {}).get('instance_id'):
             logger.info(f"Vultr instance '{name}' already exists (ID: {existing['properties']['instance_id']})")
             continue
@@ -53,6 +54,7 @@ def deploy():
             new_state = {
                 'type': 'vultr_instance',
                 'name': name,
+                **fleet_marker(res),
                 'properties': {
                     **props,
                     'instance_id': instance['id'],
@@ -65,6 +67,9 @@ def deploy():
         else:
             logger.error(f"Failed to create Vultr instance '{name}'")
 
+    save_state(state)
+    logger.debug(f"Vultr API requests: {vp.request_stats()}")
+
 
 def destroy():
     state = load_state()
@@ -76,24 +81,36 @@ def destroy():
         logger.error("Vultr API key not found in settings.yml under vultr_credentials.api_key")
         return
 
-    vp = VultrProvider(api_key)
-
-    # Destroy in reverse
-    for res in reversed(state.get('resources', [])):
-        if res.get('type') != 'vultr_instance':
-            continue
-        name = res.get('name')
-        props = res.get('properties', {})
-        iid = props.get('instance_id')
-        if not iid:
-            logger.warning(f"Skipping Vultr instance '{name}' without instance_id in state")
-            continue
-        try:
-            vp.delete_instance(iid)
-            logger.info(f"Deleted Vultr instance '{name}' (ID: {iid})")
-            update_state(state, res, 'delete')
-        except Exception as e:
-            logger.error(f"Failed to delete Vultr instance '{name}': {e}")
+    vp = VultrProvider(api_key, per_page=creds.get('per_page', 100))
+
+    # Instances do not reference each other, so all deletes can run concurrently
+    resources = list(reversed(state.of_type('vultr_instance')))
+    run_graph(
+        resources,
+        build_state_graph(state, resources),
+        lambda res: _destroy_instance(res, state, vp),
+        resolve_parallelism(),
+        reverse=True,
+        check=removed(state),
+    )
+
+    save_state(state)
+    logger.debug(f"Vultr API requests: {vp.request_stats()}")
+
+
+def _destroy_instance(res, state, vp):
+    name = res.get('name')
+    props = res.get('properties', {})
+    iid = props.get('instance_id')
+    if not iid:
+        logger.warning(f"Skipping Vultr instance '{name}' without instance_id in state")
+        return
+    try:
+        vp.delete_instance(iid)
+        logger.info(f"Deleted Vultr instance '{name}' (ID: {iid})")
+        update_state(state, res, 'delete')
+    except Exception as e:
+        logger.error(f"Failed to delete Vultr instance '{name}': {e}")
 
 
 def main():
@@ -1,11 +1,17 @@
 import argparse
 import logging
-from config_loader import load_infrastructure_config, load_user_settings
-from state.state_manager import load_state, update_state
+from config_loader import load_infrastructure_config, load_user_settings, fleet_marker, read_user_data, resolve_parallelism
+from state.state_manager import load_state, update_state, save_state
 from providers.vultr import VultrProvider
+from deployments.scheduler import build_graph, build_state_graph, run_graph, recorded, removed
+from deployments.dns_sync import diff_records, apply_diff, adopt as adopt_records, summarize
+from deployments.resolver import Resolver
+from resources.object_storage import sync_directory, sync_options
 
 logger = logging.getLogger(__name__)
 
+DNS_RECORD_TYPES = ('dns_record', 'record')
+
 
 def deploy():
     state = load_state()
@@ -18,347 +24,434 @@ def deploy():
         logger.error("Vultr API key not found in settings.yml under vultr_credentials.api_key")
         return
 
-    vp = VultrProvider(api_key)
-
-    for res in infra.get('resources', []):
-        rtype = str(res.get('type', '')).lower()
-        name = res.get('name')
-        props = res.get('properties', {})
-
-        if rtype == 'instance':
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_instance' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('instance_id'):
-                iid = existing['properties']['instance_id']
-                try:
-                    desired_tags = props.get('tags')
-                    current_tags = existing.get('properties', {}).get('tags')
-                    if desired_tags is not None and desired_tags != current_tags:
-                        vp.update_instance(iid, tags=desired_tags)
-                        logger.info(f"Updated tags for instance '{name}'")
-                    fw_name = props.get('firewall')
-                    if fw_name:
-                        fw = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_firewall' and r.get('name') == fw_name), None)
-                        if fw and fw.get('properties', {}).get('group_id'):
-                            vp.attach_firewall_group_to_instance(iid, fw['properties']['group_id'])
-                            logger.info(f"Attached firewall '{fw_name}' to instance '{name}'")
-                    update_state(state, {
-                        'type': 'vultr_instance',
-                        'name': name,
-                        'properties': {**existing.get('properties', {}), **props, 'instance_id': iid}
-                    }, 'create')
-                except Exception as e:
-                    logger.warning(f"Failed to update instance '{name}': {e}")
-                continue
-
-            ssh_ids = []
-            for key in props.get('ssh_keys', []) or []:
-                kid = vp.find_ssh_key_id(key)
-                if kid:
-                    ssh_ids.append(kid)
-            logger.info(f"Creating Vultr instance: {name}")
-            # Cloud-init/user-data helpers: support loading from file and optional base64
-            user_data = props.get('user_data')
-            if props.get('user_data_file') and not user_data:
-                try:
-                    with open(props['user_data_file'], 'r') as f:
-                        user_data = f.read()
-                except Exception as e:
-                    logger.warning(f"Failed to read user_data_file for instance '{name}': {e}")
-            # Some APIs expect base64 for user_data; allow explicit control
-            if user_data and props.get('user_data_base64'):
-                try:
-                    import base64
-                    user_data = base64.b64encode(user_data.encode()).decode()
-                except Exception as e:
-                    logger.warning(f"Failed to base64‑encode user_data for '{name}': {e}")
-            # Resolve startup script if referenced by name
-            script_id = None
-            if props.get('startup_script'):
-                ss = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_startup_script' and r.get('name') == props['startup_script']), None)
-                if ss and ss.get('properties', {}).get('script_id'):
-                    script_id = ss['properties']['script_id']
-
-            instance = vp.create_instance(
-                region=props['region'],
-                plan=props['plan'],
-                os_id=props.get('os_id'),
-                image_id=props.get('image_id'),
-                label=name,
-                ssh_key_ids=ssh_ids or None,
-                user_data=user_data,
-                startup_script_id=script_id,
-                tags=props.get('tags'),
-            )
-            if instance and instance.get('id'):
-                new_state = {
-                    'type': 'vultr_instance',
-                    'name': name,
-                    'properties': {
-                        **props,
-                        'instance_id': instance['id'],
-                        'label': instance.get('label') or name,
-                        'main_ip': instance.get('main_ip')
-                    }
-                }
-                update_state(state, new_state, 'create')
-                logger.info(f"Created Vultr instance '{name}' (ID: {instance['id']})")
-            else:
-                logger.error(f"Failed to create Vultr instance '{name}'")
+    vp = VultrProvider(api_key, per_page=creds.get('per_page', 100))
+    # References resolve from state; instances not in state fall back to one paginated listing by label
+    resolver = (Resolver(state)
+                .register('instance', 'vultr_instance', 'instance_id',
+                          lambda: {ins.get('label'): ins.get('id') for ins in vp.iter_instances()})
+                .register('firewall', 'vultr_firewall', 'group_id')
+                .register('vpc', 'vultr_vpc', 'vpc_id')
+                .register('startup_script', 'vultr_startup_script', 'script_id'))
+
+    # Independent resources are applied concurrently; references (instances, vpc, ...) order the rest.
+    # DNS records are reconciled per domain afterwards, once their domains exist.
+    resources = [res for res in infra.get('resources', []) if str(res.get('type', '')).lower() not in DNS_RECORD_TYPES]
+    records = [res for res in infra.get('resources', []) if str(res.get('type', '')).lower() in DNS_RECORD_TYPES]
+    run_graph(
+        resources,
+        build_graph(resources),
+        lambda res: _deploy_resource(res, state, vp, resolver, user_settings),
+        resolve_parallelism(),
+        check=recorded(state),
+    )
+    _sync_dns_records(records, state, vp, adopt=bool(user_settings.get('dns_adopt')))
+
+    save_state(state)
+    logger.debug(f"Vultr API requests: {vp.request_stats()}")
+
+
+def _sync_dns_records(records, state, vp, adopt=False):
+    """Reconcile DNS records one domain at a time.
+
+    Each domain's records are listed once (all pages) and diffed against the
+    configuration; only the differences are written, concurrently, and only
+    records pyraform created are deleted. With ``adopt`` nothing is written:
+    existing matching records are recorded in state and the remaining
+    differences are reported.
+    """
+    by_domain = {}
+    for res in records:
+        by_domain.setdefault(res['properties']['domain'], []).append(res)
+    managed = state.of_type('vultr_dns_record')
+    for res in managed:
+        if res.get('properties', {}).get('domain'):
+            by_domain.setdefault(res['properties']['domain'], [])
+
+    for domain, configs in by_domain.items():
+        try:
+            current = list(vp.iter_records(domain))
+        except Exception as e:
+            logger.error(f"Failed to list DNS records of '{domain}': {e}")
             continue
 
-        if rtype == 'domain':
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_domain' and r.get('name') == name), None)
-            if existing:
-                logger.info(f"Vultr domain '{name}' already ensured")
-                continue
-            ip = props.get('ip') or props.get('ip_address')
-            dom = vp.create_domain(name, ip)
-            new_state = {
-                'type': 'vultr_domain',
-                'name': name,
-                'properties': {
-                    **props,
-                    'domain': name
-                }
+        configured = {res['name'] for res in configs}
+        in_domain = [res for res in managed if res.get('properties', {}).get('domain') == domain]
+        desired = {}
+        for res in configs:
+            props = res['properties']
+            desired[res['name']] = {
+                'type': props['type'],
+                'name': props.get('name', '@'),
+                'data': props['data'],
+                **{field: props[field] for field in ('ttl', 'priority') if props.get(field) is not None}
             }
-            update_state(state, new_state, 'create')
-            logger.info(f"Ensured domain '{name}'")
+        diff = diff_records(
+            domain,
+            desired,
+            current,
+            known_ids={res['name']: res['properties'].get('record_id') for res in in_domain if res['name'] in configured},
+            managed_ids=[res['properties'].get('record_id') for res in in_domain if res['name'] not in configured]
+        )
+
+        if adopt:
+            ids, deleted = adopt_records(diff), []
+            logger.info(f"Adopting DNS records in '{domain}' without changes: {len(ids)} matched; "
+                        f"not applied: {len(diff['create'])} create, {len(diff['update'])} update, {len(diff['delete'])} delete")
+        else:
+            logger.info(f"Reconciling DNS records in '{domain}': {summarize(diff)}")
+            ids, deleted = apply_diff(
+                diff,
+                lambda record, domain=domain: (vp.create_record(domain, **record) or {}).get('id'),
+                lambda record, current, domain=domain: vp.update_record(
+                    domain, current['id'], name=record['name'], data=record['data'],
+                    ttl=record.get('ttl'), priority=record.get('priority')) and current['id'],
+                lambda current, domain=domain: vp.delete_record(domain, current['id'])
+            )
 
-        elif rtype in ('dns_record', 'record'):
-            domain = props['domain']
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_dns_record' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('record_id'):
-                logger.info(f"DNS record '{name}' already created")
+        for res in configs:
+            if res['name'] not in ids:
+                if not adopt:
+                    logger.error(f"Failed to reconcile DNS record '{res['name']}'")
                 continue
-            rec = vp.create_record(domain, type=props['type'], name=props.get('name', '@'), data=props['data'], ttl=props.get('ttl'))
-            new_state = {
+            update_state(state, {
                 'type': 'vultr_dns_record',
-                'name': name,
+                'name': res['name'],
                 'properties': {
-                    **props,
-                    'record_id': rec.get('id') if rec else None
+                    **res['properties'],
+                    'record_id': ids[res['name']]
                 }
-            }
-            update_state(state, new_state, 'create')
-            logger.info(f"Created DNS record '{name}' in domain '{domain}'")
+            }, 'create')
+        # Forget removed records that were deleted now or are already gone from the domain
+        gone = {str(record_id) for record_id in deleted}
+        existing_ids = {str(r.get('id')) for r in current}
+        for res in in_domain:
+            record_id = str(res['properties'].get('record_id'))
+            if res['name'] not in configured and (record_id in gone or record_id not in existing_ids):
+                update_state(state, res, 'delete')
 
-        elif rtype in ('volume', 'block', 'block_storage'):
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_volume' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('block_id'):
-                logger.info(f"Vultr block '{name}' already exists")
-                continue
-            blk = vp.create_block(region=props['region'], size_gb=props['size_gb'] or props.get('size_gigabytes') or props.get('size'), label=name)
-            block_id = blk.get('id') if blk else None
-            attach_to = props.get('attach_to')
-            if attach_to and block_id:
-                try:
-                    # find instance by label from state
-                    inst = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_instance' and r.get('name') == attach_to), None)
-                    if inst and inst.get('properties', {}).get('instance_id'):
-                        vp.attach_block(block_id, inst['properties']['instance_id'])
-                        logger.info(f"Attached block '{name}' to instance '{attach_to}'")
-                except Exception as e:
-                    logger.warning(f"Failed to attach block '{name}' to '{attach_to}': {e}")
+
+def _deploy_resource(res, state, vp, resolver, user_settings):
+    """Create or reconcile a single resource from infrastructure.yml."""
+    rtype = str(res.get('type', '')).lower()
+    name = res.get('name')
+    props = res.get('properties', {})
+
+    if rtype == 'instance':
+        existing = state.find(name, 'vultr_instance')
+        if existing and existing.get('properties', {}).get('instance_id'):
+            iid = existing['properties']['instance_id']
+            try:
+                desired_tags = props.get('tags')
+                current_tags = state.blobs.resolve(existing.get('properties', {}).get('tags'))
+                if desired_tags is not None and desired_tags != current_tags:
+                    vp.update_instance(iid, tags=desired_tags)
+                    logger.info(f"Updated tags for instance '{name}'")
+                fw_name = props.get('firewall')
+                if fw_name:
+                    group_id = resolver.resolve('firewall', fw_name)
+                    if group_id:
+                        vp.attach_firewall_group_to_instance(iid, group_id)
+                        logger.info(f"Attached firewall '{fw_name}' to instance '{name}'")
+                update_state(state, {
+                    'type': 'vultr_instance',
+                    'name': name,
+                    **fleet_marker(res),
+                    'properties': {**existing.get('properties', {}), **props, 'instance_id': iid}
+                }, 'create')
+            except Exception as e:
+                logger.warning(f"Failed to update instance '{name}': {e}")
+            return
+
+        ssh_ids = []
+        for key in props.get('ssh_keys', []) or []:
+            kid = vp.find_ssh_key_id(key)
+            if kid:
+                ssh_ids.append(kid)
+        logger.info(f"Creating Vultr instance: {name}")
+        # Cloud-init/user-data helpers: support loading from file and optional base64
+        user_data = props.get('user_data')
+        if props.get('user_data_file') and not user_data:
+            try:
+                user_data = read_user_data(props['user_data_file'])
+            except Exception as e:
+                logger.warning(f"Failed to read user_data_file for instance '{name}': {e}")
+        # Some APIs expect base64 for user_data; allow explicit control
+        if user_data and props.get('user_data_base64'):
+            try:
+                import base64
+                user_data = base64.b64encode(user_data.encode()).decode()
+            except Exception as e:
+                logger.warning(f"Failed to base64‑encode user_data for '{name}': {e}")
+        # Resolve startup script if referenced by name
+        script_id = resolver.resolve('startup_script', props.get('startup_script'))
+
+        instance = vp.create_instance(
+            region=props['region'],
+            plan=props['plan'],
+            os_id=props.get('os_id'),
+            image_id=props.get('image_id'),
+            label=name,
+            ssh_key_ids=ssh_ids or None,
+            user_data=user_data,
+            startup_script_id=script_id,
+            tags=props.get('tags'),
+        )
+        if instance and instance.get('id'):
             new_state = {
-                'type': 'vultr_volume',
+                'type': 'vultr_instance',
                 'name': name,
+                **fleet_marker(res),
                 'properties': {
                     **props,
-                    'block_id': block_id
+                    'instance_id': instance['id'],
+                    'label': instance.get('label') or name,
+                    'main_ip': instance.get('main_ip')
                 }
             }
             update_state(state, new_state, 'create')
-            logger.info(f"Created block storage '{name}'")
+            logger.info(f"Created Vultr instance '{name}' (ID: {instance['id']})")
+        else:
+            logger.error(f"Failed to create Vultr instance '{name}'")
+        return
 
-        elif rtype == 'firewall':
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_firewall' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('group_id'):
-                logger.info(f"Vultr firewall '{name}' already exists")
-                continue
-            fw = vp.create_firewall_group(description=name)
-            group_id = fw.get('id') if fw else None
-            # rules: list of dicts with protocol, ip_type, subnet, subnet_size, port (optional)
-            for rule in props.get('rules', []) or []:
+    if rtype == 'domain':
+        existing = state.find(name, 'vultr_domain')
+        if existing:
+            logger.info(f"Vultr domain '{name}' already ensured")
+            return
+        ip = props.get('ip') or props.get('ip_address')
+        dom = vp.create_domain(name, ip)
+        new_state = {
+            'type': 'vultr_domain',
+            'name': name,
+            'properties': {
+                **props,
+                'domain': name
+            }
+        }
+        update_state(state, new_state, 'create')
+        logger.info(f"Ensured domain '{name}'")
+
+    elif rtype in ('volume', 'block', 'block_storage'):
+        existing = state.find(name, 'vultr_volume')
+        if existing and existing.get('properties', {}).get('block_id'):
+            logger.info(f"Vultr block '{name}' already exists")
+            return
+        blk = vp.create_block(region=props['region'], size_gb=props['size_gb'] or props.get('size_gigabytes') or props.get('size'), label=name)
+        block_id = blk.get('id') if blk else None
+        attach_to = props.get('attach_to')
+        if attach_to and block_id:
+            try:
+                instance_id = resolver.resolve('instance', attach_to)
+                if instance_id:
+                    vp.attach_block(block_id, instance_id)
+                    logger.info(f"Attached block '{name}' to instance '{attach_to}'")
+            except Exception as e:
+                logger.warning(f"Failed to attach block '{name}' to '{attach_to}': {e}")
+        new_state = {
+            'type': 'vultr_volume',
+            'name': name,
+            'properties': {
+                **props,
+                'block_id': block_id
+            }
+        }
+        update_state(state, new_state, 'create')
+        logger.info(f"Created block storage '{name}'")
+
+    elif rtype == 'firewall':
+        existing = state.find(name, 'vultr_firewall')
+        if existing and existing.get('properties', {}).get('group_id'):
+            logger.info(f"Vultr firewall '{name}' already exists")
+            return
+        fw = vp.create_firewall_group(description=name)
+        group_id = fw.get('id') if fw else None
+        # rules: list of dicts with protocol, ip_type, subnet, subnet_size, port (optional)
+        for rule in props.get('rules', []) or []:
+            try:
+                vp.create_firewall_rule(group_id, protocol=rule['protocol'], ip_type=rule['ip_type'], subnet=rule['subnet'], subnet_size=rule['subnet_size'], port=rule.get('port'))
+            except Exception as e:
+                logger.warning(f"Failed to add rule to firewall '{name}': {e}")
+        # attach to instances
+        for inst_name in props.get('instances', []) or []:
+            instance_id = resolver.resolve('instance', inst_name)
+            if instance_id:
                 try:
-                    vp.create_firewall_rule(group_id, protocol=rule['protocol'], ip_type=rule['ip_type'], subnet=rule['subnet'], subnet_size=rule['subnet_size'], port=rule.get('port'))
+                    vp.attach_firewall_group_to_instance(instance_id, group_id)
                 except Exception as e:
-                    logger.warning(f"Failed to add rule to firewall '{name}': {e}")
-            # attach to instances
+                    logger.warning(f"Failed to attach firewall '{name}' to instance '{inst_name}': {e}")
+        update_state(state, {
+            'type': 'vultr_firewall',
+            'name': name,
+            'properties': {**props, 'group_id': group_id}
+        }, 'create')
+        logger.info(f"Created firewall '{name}'")
+
+    elif rtype in ('load_balancer', 'loadbalancer', 'lb'):
+        existing = state.find(name, 'vultr_load_balancer')
+        if existing and existing.get('properties', {}).get('load_balancer_id'):
+            logger.info(f"Vultr load balancer '{name}' already exists")
+            return
+        # resolve instance IDs by name
+        instance_ids = resolver.resolve_all('instance', props.get('instances'))
+        lb = vp.create_load_balancer(
+            region=props['region'],
+            label=name,
+            forwarding_rules=props['forwarding_rules'],
+            instances=instance_ids or None,
+            health_check=props.get('health_check'),
+            sticky_sessions=props.get('sticky_sessions'),
+            ssl=props.get('ssl'),
+            ssl_redirect=props.get('ssl_redirect')
+        )
+        update_state(state, {
+            'type': 'vultr_load_balancer',
+            'name': name,
+            'properties': {**props, 'load_balancer_id': (lb or {}).get('id')}
+        }, 'create')
+        logger.info(f"Created load balancer '{name}'")
+
+    elif rtype == 'snapshot':
+        existing = state.find(name, 'vultr_snapshot')
+        if existing and existing.get('properties', {}).get('snapshot_id'):
+            logger.info(f"Vultr snapshot '{name}' already exists")
+            return
+        # find instance by name
+        inst_name = props['instance']
+        instance_id = resolver.resolve('instance', inst_name)
+        if not instance_id:
+            logger.error(f"Cannot create snapshot '{name}': instance '{inst_name}' not found")
+            return
+        snap = vp.create_snapshot(instance_id=instance_id, label=name)
+        update_state(state, {
+            'type': 'vultr_snapshot',
+            'name': name,
+            'properties': {**props, 'snapshot_id': (snap or {}).get('id')}
+        }, 'create')
+        logger.info(f"Created snapshot '{name}'")
+
+    elif rtype in ('vpc_route','vpcroute','route'):
+        # Create a route in a VPC
+        vpc_name = props['vpc']
+        vpc_id = resolver.resolve('vpc', vpc_name)
+        if not vpc_id:
+            logger.error(f"Cannot create VPC route '{name}': VPC '{vpc_name}' not found")
+        else:
+            route = vp.create_vpc_route(vpc_id, cidr=props['cidr'], next_hop=props['next_hop'])
+            update_state(state, {'type': 'vultr_vpc_route','name': name,'properties': {**props, 'route_id': (route or {}).get('id')}}, 'create')
+            logger.info(f"Created VPC route '{name}'")
+
+    elif rtype in ('vpc_peering','vpcpeer','peering'):
+        # Create VPC peering between two VPCs
+        vpc_a = resolver.resolve('vpc', props['vpc_a'])
+        vpc_b = resolver.resolve('vpc', props['vpc_b'])
+        if not vpc_a or not vpc_b:
+            logger.error(f"Cannot create VPC peering '{name}': one or both VPCs not found")
+        else:
+            peer = vp.create_vpc_peering(vpc_id=vpc_a, peer_vpc_id=vpc_b, label=name)
+            update_state(state, {'type': 'vultr_vpc_peering','name': name,'properties': {**props, 'peering_id': (peer or {}).get('id')}}, 'create')
+            logger.info(f"Created VPC peering '{name}'")
+
+
+    elif rtype == 'vpc':
+        existing = state.find(name, 'vultr_vpc')
+        if existing and existing.get('properties', {}).get('vpc_id'):
+            logger.info(f"VPC '{name}' already exists")
+            # Attach instances if listed
             for inst_name in props.get('instances', []) or []:
-                inst = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_instance' and r.get('name') == inst_name), None)
-                if inst and inst.get('properties', {}).get('instance_id'):
+                instance_id = resolver.resolve('instance', inst_name)
+                if instance_id:
                     try:
-                        vp.attach_firewall_group_to_instance(inst['properties']['instance_id'], group_id)
+                        vp.attach_instance_to_vpc(instance_id, existing['properties']['vpc_id'])
                     except Exception as e:
-                        logger.warning(f"Failed to attach firewall '{name}' to instance '{inst_name}': {e}")
-            update_state(state, {
-                'type': 'vultr_firewall',
-                'name': name,
-                'properties': {**props, 'group_id': group_id}
-            }, 'create')
-            logger.info(f"Created firewall '{name}'")
+                        logger.warning(f"Failed attaching instance '{inst_name}' to VPC '{name}': {e}")
 
-        elif rtype in ('load_balancer', 'loadbalancer', 'lb'):
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_load_balancer' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('load_balancer_id'):
-                logger.info(f"Vultr load balancer '{name}' already exists")
-                continue
-            # resolve instance IDs by name
-            instance_ids = []
+        else:
+            vpc = vp.create_vpc(region=props['region'], description=props.get('description'), ip_block=props.get('ip_block'), prefix_length=props.get('prefix_length'))
+            vpc_id = (vpc or {}).get('id')
+            # Attach instances
             for inst_name in props.get('instances', []) or []:
-                inst = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_instance' and r.get('name') == inst_name), None)
-                if inst and inst.get('properties', {}).get('instance_id'):
-                    instance_ids.append(inst['properties']['instance_id'])
-            lb = vp.create_load_balancer(
-                region=props['region'],
-                label=name,
-                forwarding_rules=props['forwarding_rules'],
-                instances=instance_ids or None,
-                health_check=props.get('health_check'),
-                sticky_sessions=props.get('sticky_sessions'),
-                ssl=props.get('ssl'),
-                ssl_redirect=props.get('ssl_redirect')
-            )
-            update_state(state, {
-                'type': 'vultr_load_balancer',
-                'name': name,
-                'properties': {**props, 'load_balancer_id': (lb or {}).get('id')}
-            }, 'create')
-            logger.info(f"Created load balancer '{name}'")
-
-        elif rtype == 'snapshot':
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_snapshot' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('snapshot_id'):
-                logger.info(f"Vultr snapshot '{name}' already exists")
-                continue
-            # find instance by name
-            inst_name = props['instance']
-            inst = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_instance' and r.get('name') == inst_name), None)
-            if not inst or not inst.get('properties', {}).get('instance_id'):
-                logger.error(f"Cannot create snapshot '{name}': instance '{inst_name}' not found in state")
-                continue
-            snap = vp.create_snapshot(instance_id=inst['properties']['instance_id'], label=name)
-            update_state(state, {
-                'type': 'vultr_snapshot',
-                'name': name,
-                'properties': {**props, 'snapshot_id': (snap or {}).get('id')}
-            }, 'create')
-            logger.info(f"Created snapshot '{name}'")
-
-        elif rtype in ('vpc_route','vpcroute','route'):
-            # Create a route in a VPC
-            vpc_name = props['vpc']
-            vpc = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_vpc' and r.get('name') == vpc_name), None)
-            if not vpc or not vpc.get('properties', {}).get('vpc_id'):
-                logger.error(f"Cannot create VPC route '{name}': VPC '{vpc_name}' not found")
-            else:
-                route = vp.create_vpc_route(vpc['properties']['vpc_id'], cidr=props['cidr'], next_hop=props['next_hop'])
-                update_state(state, {'type': 'vultr_vpc_route','name': name,'properties': {**props, 'route_id': (route or {}).get('id')}}, 'create')
-                logger.info(f"Created VPC route '{name}'")
-
-        elif rtype in ('vpc_peering','vpcpeer','peering'):
-            # Create VPC peering between two VPCs
-            a = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_vpc' and r.get('name') == props['vpc_a']), None)
-            b = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_vpc' and r.get('name') == props['vpc_b']), None)
-            if not a or not b or not a.get('properties', {}).get('vpc_id') or not b.get('properties', {}).get('vpc_id'):
-                logger.error(f"Cannot create VPC peering '{name}': one or both VPCs not found")
-            else:
-                peer = vp.create_vpc_peering(vpc_id=a['properties']['vpc_id'], peer_vpc_id=b['properties']['vpc_id'], label=name)
-                update_state(state, {'type': 'vultr_vpc_peering','name': name,'properties': {**props, 'peering_id': (peer or {}).get('id')}}, 'create')
-                logger.info(f"Created VPC peering '{name}'")
-
-
-        elif rtype == 'vpc':
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_vpc' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('vpc_id'):
-                logger.info(f"VPC '{name}' already exists")
-                # Attach instances if listed
-                for inst_name in props.get('instances', []) or []:
-                    inst = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_instance' and r.get('name') == inst_name), None)
-                    if inst and inst.get('properties', {}).get('instance_id') and existing['properties'].get('vpc_id'):
-                        try:
-                            vp.attach_instance_to_vpc(inst['properties']['instance_id'], existing['properties']['vpc_id'])
-                        except Exception as e:
-                            logger.warning(f"Failed attaching instance '{inst_name}' to VPC '{name}': {e}")
-                
-            else:
-                vpc = vp.create_vpc(region=props['region'], description=props.get('description'), ip_block=props.get('ip_block'), prefix_length=props.get('prefix_length'))
-                vpc_id = (vpc or {}).get('id')
-                # Attach instances
-                for inst_name in props.get('instances', []) or []:
-                    inst = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_instance' and r.get('name') == inst_name), None)
-                    if inst and inst.get('properties', {}).get('instance_id') and vpc_id:
-                        try:
-                            vp.attach_instance_to_vpc(inst['properties']['instance_id'], vpc_id)
-                        except Exception as e:
-                            logger.warning(f"Failed attaching instance '{inst_name}' to VPC '{name}': {e}")
-                update_state(state, {'type': 'vultr_vpc','name': name,'properties': {**props, 'vpc_id': vpc_id}}, 'create')
-                logger.info(f"Created VPC '{name}'")
-
-        elif rtype in ('reserved_ip','reservedip','rip'):
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_reserved_ip' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('ip'):
-                logger.info(f"Reserved IP '{name}' already exists")
-            else:
-                rip = vp.create_reserved_ip(region=props['region'], ip_type=props.get('ip_type','v4'), label=name)
-                ip = (rip or {}).get('ip') or (rip or {}).get('address')
-                # attach to instance if provided
-                inst_name = props.get('attach_to')
-                if inst_name and ip:
-                    inst = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_instance' and r.get('name') == inst_name), None)
-                    if inst and inst.get('properties', {}).get('instance_id'):
-                        try:
-                            vp.attach_reserved_ip(ip, inst['properties']['instance_id'])
-                        except Exception as e:
-                            logger.warning(f"Failed to attach reserved IP '{ip}' to '{inst_name}': {e}")
-                update_state(state, {'type': 'vultr_reserved_ip','name': name,'properties': {**props, 'ip': ip}}, 'create')
-                logger.info(f"Created reserved IP '{name}'")
-
-        elif rtype in ('kubernetes','k8s','vke'):
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_k8s' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('cluster_id'):
-                logger.info(f"VKE cluster '{name}' already exists")
-            else:
-                cluster = vp.create_k8s_cluster(region=props['region'], version=props['version'], label=name, node_pools=props['node_pools'])
-                update_state(state, {'type': 'vultr_k8s','name': name,'properties': {**props, 'cluster_id': (cluster or {}).get('id')}}, 'create')
-                logger.info(f"Created VKE cluster '{name}'")
-
-        elif rtype in ('object_storage','objectstorage','bucket'):
-            # Manage via S3
-            oss = user_settings.get('vultr_object_storage', {}) or {}
-            access_key = oss.get('access_key') or oss.get('access_key_id')
-            secret_key = oss.get('secret_key') or oss.get('secret_access_key')
-            region = props.get('region') or oss.get('region') or 'ewr1'
-            if not (access_key and secret_key and region):
-                logger.error("Object Storage credentials/region missing in settings.yml (vultr_object_storage)")
-            else:
-                s3 = vp.s3_client(region=region, access_key=access_key, secret_key=secret_key)
-                bucket = name
-                try:
-                    s3.head_bucket(Bucket=bucket)
-                    logger.info(f"Object Storage bucket '{bucket}' already exists")
-                except Exception:
-                    s3.create_bucket(Bucket=bucket)
-                    logger.info(f"Created Object Storage bucket '{bucket}'")
-                update_state(state, {'type': 'vultr_object_storage','name': name,'properties': {**props, 'region': region}}, 'create')
-
-        elif rtype in ('startup_script','startupscript','script'):
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_startup_script' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('script_id'):
-                logger.info(f"Startup script '{name}' already exists")
-                continue
-            scr = vp.create_startup_script(name=name, script=props['script'], script_type=props.get('type', 'boot'))
-            update_state(state, {'type': 'vultr_startup_script','name': name,'properties': {**props, 'script_id': (scr or {}).get('id')}}, 'create')
-            logger.info(f"Created startup script '{name}'")
-
-        elif rtype in ('ssh_key','sshkey'):
-            existing = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_ssh_key' and r.get('name') == name), None)
-            if existing and existing.get('properties', {}).get('key_id'):
-                logger.info(f"SSH key '{name}' already exists")
-                continue
-            key = vp.create_ssh_key(name=name, ssh_key=props['public_key'])
-            update_state(state, {'type': 'vultr_ssh_key','name': name,'properties': {**props, 'key_id': (key or {}).get('id')}}, 'create')
-            logger.info(f"Created SSH key '{name}'")
+                instance_id = resolver.resolve('instance', inst_name)
+                if instance_id and vpc_id:
+                    try:
+                        vp.attach_instance_to_vpc(instance_id, vpc_id)
+                    except Exception as e:
+                        logger.warning(f"Failed attaching instance '{inst_name}' to VPC '{name}': {e}")
+            update_state(state, {'type': 'vultr_vpc','name': name,'properties': {**props, 'vpc_id': vpc_id}}, 'create')
+            logger.info(f"Created VPC '{name}'")
+
+    elif rtype in ('reserved_ip','reservedip','rip'):
+        existing = state.find(name, 'vultr_reserved_ip')
+        if existing and existing.get('properties', {}).get('ip'):
+            logger.info(f"Reserved IP '{name}' already exists")
+        else:
+            rip = vp.create_reserved_ip(region=props['region'], ip_type=props.get('ip_type','v4'), label=name)
+            ip = (rip or {}).get('ip') or (rip or {}).get('address')
+            # attach to instance if provided
+            inst_name = props.get('attach_to')
+            if inst_name and ip:
+                instance_id = resolver.resolve('instance', inst_name)
+                if instance_id:
+                    try:
+                        vp.attach_reserved_ip(ip, instance_id)
+                    except Exception as e:
+                        logger.warning(f"Failed to attach reserved IP '{ip}' to '{inst_name}': {e}")
+            update_state(state, {'type': 'vultr_reserved_ip','name': name,'properties': {**props, 'ip': ip}}, 'create')
+            logger.info(f"Created reserved IP '{name}'")
+
+    elif rtype in ('kubernetes','k8s','vke'):
+        existing = state.find(name, 'vultr_k8s')
+        if existing and existing.get('properties', {}).get('cluster_id'):
+            logger.info(f"VKE cluster '{name}' already exists")
+        else:
+            cluster = vp.create_k8s_cluster(region=props['region'], version=props['version'], label=name, node_pools=props['node_pools'])
+            update_state(state, {'type': 'vultr_k8s','name': name,'properties': {**props, 'cluster_id': (cluster or {}).get('id')}}, 'create')
+            logger.info(f"Created VKE cluster '{name}'")
+
+    elif rtype in ('object_storage','objectstorage','bucket'):
+        # Manage via S3
+        oss = user_settings.get('vultr_object_storage', {}) or {}
+        access_key = oss.get('access_key') or oss.get('access_key_id')
+        secret_key = oss.get('secret_key') or oss.get('secret_access_key')
+        region = props.get('region') or oss.get('region') or 'ewr1'
+        if not (access_key and secret_key and region):
+            logger.error("Object Storage credentials/region missing in settings.yml (vultr_object_storage)")
+        else:
+            # Validated first, so a bad sync never leaves an untracked bucket behind
+            try:
+                sync = sync_options(props.get('sync'))
+            except ValueError as e:
+                logger.error(f"Invalid sync for Object Storage bucket '{name}': {e}")
+                return
+            s3 = vp.s3_client(region=region, access_key=access_key, secret_key=secret_key)
+            bucket = name
+            try:
+                s3.head_bucket(Bucket=bucket)
+                logger.info(f"Object Storage bucket '{bucket}' already exists")
+            except Exception:
+                s3.create_bucket(Bucket=bucket)
+                logger.info(f"Created Object Storage bucket '{bucket}'")
+            update_state(state, {'type': 'vultr_object_storage','name': name,'properties': {**props, 'region': region}}, 'create')
+            if sync:
+                sync_directory(s3, bucket, **sync)
+
+    elif rtype in ('startup_script','startupscript','script'):
+        existing = state.find(name, 'vultr_startup_script')
+        if existing and existing.get('properties', {}).get('script_id'):
+            logger.info(f"Startup script '{name}' already exists")
+            return
+        scr = vp.create_startup_script(name=name, script=props['script'], script_type=props.get('type', 'boot'))
+        update_state(state, {'type': 'vultr_startup_script','name': name,'properties': {**props, 'script_id': (scr or {}).get('id')}}, 'create')
+        logger.info(f"Created startup script '{name}'")
+
+    elif rtype in ('ssh_key','sshkey'):
+        existing = state.find(name, 'vultr_ssh_key')
+        if existing and existing.get('properties', {}).get('key_id'):
+            logger.info(f"SSH key '{name}' already exists")
+            return
+        key = vp.create_ssh_key(name=name, ssh_key=props['public_key'])
+        update_state(state, {'type': 'vultr_ssh_key','name': name,'properties': {**props, 'key_id': (key or {}).get('id')}}, 'create')
+        logger.info(f"Created SSH key '{name}'")
 
 
 def destroy():
@@ -371,57 +464,98 @@ def destroy():
         logger.error("Vultr API key not found in settings.yml under vultr_credentials.api_key")
         return
 
-    vp = VultrProvider(api_key)
+    vp = VultrProvider(api_key, per_page=creds.get('per_page', 100))
+
+    # DNS records go first, one listing and concurrent deletes per domain
+    _destroy_dns_records(state, vp)
 
-    for res in reversed(state.get('resources', [])):
-        rtype = res.get('type')
-        name = res.get('name')
-        props = res.get('properties', {})
+    # Tear down leaves first: whatever references a resource is deleted before it
+    resources = list(reversed(state.resources))
+    run_graph(
+        resources,
+        build_state_graph(state, resources),
+        lambda res: _destroy_resource(res, state, vp),
+        resolve_parallelism(),
+        reverse=True,
+        check=removed(state),
+    )
+
+    save_state(state)
+    logger.debug(f"Vultr API requests: {vp.request_stats()}")
+
+
+def _destroy_dns_records(state, vp):
+    """Delete every DNS record in state, listing each domain once."""
+    by_domain = {}
+    for res in state.of_type('vultr_dns_record'):
+        if res.get('properties', {}).get('record_id'):
+            by_domain.setdefault(res['properties']['domain'], []).append(res)
+
+    for domain, records in by_domain.items():
         try:
-            if rtype == 'vultr_vpc_route' and props.get('route_id') and props.get('vpc'):
-                vpc = next((r for r in state.get('resources', []) if r.get('type') == 'vultr_vpc' and r.get('name') == props['vpc']), None)
-                if vpc and vpc.get('properties', {}).get('vpc_id'):
-                    vp.delete_vpc_route(vpc['properties']['vpc_id'], props['route_id'])
-                    update_state(state, res, 'delete')
-                    logger.info(f"Deleted VPC route '{name}'")
-            elif rtype == 'vultr_vpc_peering' and props.get('peering_id'):
-                vp.delete_vpc_peering(props['peering_id'])
-                update_state(state, res, 'delete')
-                logger.info(f"Deleted VPC peering '{name}'")
-            if rtype == 'vultr_instance' and props.get('instance_id'):
-                vp.delete_instance(props['instance_id'])
-                update_state(state, res, 'delete')
-                logger.info(f"Deleted instance '{name}'")
-            if rtype == 'vultr_dns_record' and props.get('record_id'):
-                vp.delete_record(props['domain'], props['record_id'])
-                update_state(state, res, 'delete')
-                logger.info(f"Deleted DNS record '{name}'")
-            elif rtype == 'vultr_domain' and props.get('domain'):
-                vp.delete_domain(props['domain'])
-                update_state(state, res, 'delete')
-                logger.info(f"Deleted domain '{name}'")
-            elif rtype == 'vultr_volume' and props.get('block_id'):
-                try:
-                    vp.detach_block(props['block_id'])
-                except Exception:
-                    pass
-                vp.delete_block(props['block_id'])
-                update_state(state, res, 'delete')
-                logger.info(f"Deleted block '{name}'")
-            elif rtype == 'vultr_firewall' and props.get('group_id'):
-                vp.delete_firewall_group(props['group_id'])
-                update_state(state, res, 'delete')
-                logger.info(f"Deleted firewall '{name}'")
-            elif rtype == 'vultr_load_balancer' and props.get('load_balancer_id'):
-                vp.delete_load_balancer(props['load_balancer_id'])
+            current = list(vp.iter_records(domain))
+        except Exception as e:
+            logger.error(f"Failed to list DNS records of '{domain}': {e}")
+            continue
+        diff = diff_records(domain, {}, current, managed_ids=[res['properties']['record_id'] for res in records])
+        logger.info(f"Deleting {len(diff['delete'])} DNS record(s) from '{domain}'")
+        _, deleted = apply_diff(diff, None, None, lambda current, domain=domain: vp.delete_record(domain, current['id']))
+        # Records deleted now, or already gone, leave state
+        existing_ids = {str(r.get('id')) for r in current}
+        gone = {str(record_id) for record_id in deleted}
+        for res in records:
+            record_id = str(res['properties']['record_id'])
+            if record_id in gone or record_id not in existing_ids:
                 update_state(state, res, 'delete')
-                logger.info(f"Deleted load balancer '{name}'")
-            elif rtype == 'vultr_snapshot' and props.get('snapshot_id'):
-                vp.delete_snapshot(props['snapshot_id'])
+                logger.info(f"Deleted DNS record '{res['name']}'")
+
+
+def _destroy_resource(res, state, vp):
+    """Delete a single resource recorded in state."""
+    rtype = res.get('type')
+    name = res.get('name')
+    props = res.get('properties', {})
+    try:
+        if rtype == 'vultr_vpc_route' and props.get('route_id') and props.get('vpc'):
+            vpc = state.find(props['vpc'], 'vultr_vpc')
+            if vpc and vpc.get('properties', {}).get('vpc_id'):
+                vp.delete_vpc_route(vpc['properties']['vpc_id'], props['route_id'])
                 update_state(state, res, 'delete')
-                logger.info(f"Deleted snapshot '{name}'")
-        except Exception as e:
-            logger.error(f"Failed to delete {rtype} '{name}': {e}")
+                logger.info(f"Deleted VPC route '{name}'")
+        elif rtype == 'vultr_vpc_peering' and props.get('peering_id'):
+            vp.delete_vpc_peering(props['peering_id'])
+            update_state(state, res, 'delete')
+            logger.info(f"Deleted VPC peering '{name}'")
+        if rtype == 'vultr_instance' and props.get('instance_id'):
+            vp.delete_instance(props['instance_id'])
+            update_state(state, res, 'delete')
+            logger.info(f"Deleted instance '{name}'")
+        if rtype == 'vultr_domain' and props.get('domain'):
+            vp.delete_domain(props['domain'])
+            update_state(state, res, 'delete')
+            logger.info(f"Deleted domain '{name}'")
+        elif rtype == 'vultr_volume' and props.get('block_id'):
+            try:
+                vp.detach_block(props['block_id'])
+            except Exception:
+                pass
+            vp.delete_block(props['block_id'])
+            update_state(state, res, 'delete')
+            logger.info(f"Deleted block '{name}'")
+        elif rtype == 'vultr_firewall' and props.get('group_id'):
+            vp.delete_firewall_group(props['group_id'])
+            update_state(state, res, 'delete')
+            logger.info(f"Deleted firewall '{name}'")
+        elif rtype == 'vultr_load_balancer' and props.get('load_balancer_id'):
+            vp.delete_load_balancer(props['load_balancer_id'])
+            update_state(state, res, 'delete')
+            logger.info(f"Deleted load balancer '{name}'")
+        elif rtype == 'vultr_snapshot' and props.get('snapshot_id'):
+            vp.delete_snapshot(props['snapshot_id'])
+            update_state(state, res, 'delete')
+            logger.info(f"Deleted snapshot '{name}'")
+    except Exception as e:
+        logger.error(f"Failed to delete {rtype} '{name}': {e}")
 
 
 def main():
@@ -1,8 +1,11 @@
 import argparse
 from config_loader import load_infrastructure_config, load_user_settings
 from providers.aws import AWSProvider
-from state.state_manager import load_state, update_state
-from resources.aws.dns import Route53Zone, Route53Record, fetch_hosted_zone_id
+from state.state_manager import load_state, update_state, save_state
+from resources.aws.dns import (
+    Route53Zone, HostedZoneIndex, record_key, record_set_from_properties,
+    list_record_sets, diff_record_sets, submit_changes, sync_zone_records,
+)
 
 
 def deploy():
@@ -22,7 +25,9 @@ def deploy():
     )
     
     route53_client = aws_provider.client('route53')
+    zone_index = HostedZoneIndex(route53_client)
 
+    record_configs = []
     for resource_config in infrastructure_config['resources']:
         resource_type = resource_config['type'].lower()
 
@@ -33,6 +38,7 @@ def deploy():
             zone.create(route53_client)
 
             if zone.hosted_zone_id:
+                zone_index.add(zone_properties['domain_name'], zone.hosted_zone_id)
                 new_dns_state = {
                     "type": "DNSZone",
                     "name": resource_config['name'],
@@ -47,39 +53,61 @@ def deploy():
                 print(f"Failed to create Route53 Zone for {resource_config['name']}")
 
         elif resource_type == 'route53_record':
-            record_properties = resource_config['properties']
-            print(f"Creating Route53 Record: {resource_config['name']} with properties {record_properties}")
-            hosted_zone_id = fetch_hosted_zone_id(route53_client, record_properties['zone_name'])
-
-            if hosted_zone_id:
-                record = Route53Record(
-                    hosted_zone_id=hosted_zone_id,
-                    zone_name=record_properties['zone_name'],
-                    record_type=record_properties['record_type'],
-                    ttl=record_properties['ttl'],
-                    values=record_properties['values']
-                )
-                record.create(route53_client)
-
-                new_dns_record_state = {
-                    "type": "DNSRecord",
-                    "name": resource_config['name'],
-                    "properties": {
-                        "hosted_zone_id": hosted_zone_id,
-                        "zone_name": record_properties['zone_name'],
-                        "record_type": record_properties['record_type'],
-                        "ttl": record_properties['ttl'],
-                        "values": record_properties['values'],
-                        "status": "created"
-                    }
-                }
-                update_state(state, new_dns_record_state, "create")
-            else:
-                print(f"Failed to find or create Route53 Record for {resource_config['name']}")
+            record_configs.append(resource_config)
 
         else:
             print(f"Unsupported resource type: {resource_type}")
 
+    # Records are reconciled per hosted zone: one listing and a few ChangeBatches per zone
+    records_by_zone = {}
+    configured_names = {resource_config['name'] for resource_config in record_configs}
+    for resource_config in record_configs:
+        try:
+            hosted_zone_id = zone_index.resolve(resource_config['properties'])
+        except Exception as e:
+            print(f"Error resolving hosted zone for {resource_config['name']}: {e}")
+            hosted_zone_id = None
+        if hosted_zone_id:
+            records_by_zone.setdefault(hosted_zone_id, []).append(resource_config)
+        else:
+            print(f"Failed to find or create Route53 Record for {resource_config['name']}")
+    # Zones holding records pyraform created earlier are synced too, so removed records get deleted
+    for resource in state.of_type('DNSRecord'):
+        records_by_zone.setdefault(resource['properties'].get('hosted_zone_id'), [])
+
+    for hosted_zone_id, configs in records_by_zone.items():
+        if not hosted_zone_id:
+            continue
+        print(f"Syncing {len(configs)} Route53 Record(s) in hosted zone {hosted_zone_id}")
+        # Records still in configuration are never deleted here, even if their zone could not be resolved
+        managed = [res for res in state.of_type('DNSRecord')
+                   if res['properties'].get('hosted_zone_id') == hosted_zone_id and res['name'] not in configured_names]
+        try:
+            sync_zone_records(
+                route53_client,
+                hosted_zone_id,
+                [record_set_from_properties(rc['properties']) for rc in configs],
+                managed=[record_key(record_set_from_properties(res['properties'])) for res in managed]
+            )
+        except Exception as e:
+            print(f"Failed to sync Route53 Records in hosted zone {hosted_zone_id}: {e}")
+            continue
+
+        for resource_config in configs:
+            new_dns_record_state = {
+                "type": "DNSRecord",
+                "name": resource_config['name'],
+                "properties": {
+                    **resource_config['properties'],
+                    "hosted_zone_id": hosted_zone_id,
+                    "status": "created"
+                }
+            }
+            update_state(state, new_dns_record_state, "create")
+        for resource in managed:
+            update_state(state, resource, "delete")
+
+    save_state(state)
     print("Infrastructure deployment process completed.")
     
 def destroy():
@@ -96,35 +124,63 @@ def destroy():
         region=aws_credentials['region']
     )
     route53_client = aws_provider.client('route53')
+    zone_index = HostedZoneIndex(route53_client)
 
-    # Reverse the order for destruction (assuming dependencies)
-    for resource_config in reversed(state.get('resources', [])):
+    # Records are deleted first, with one listing and batched DELETEs per hosted zone; then the zones
+    resources = list(reversed(state.resources))
+    records_by_zone = {}
+    for resource_config in resources:
+        resource_type = resource_config['type'].lower()
+        resource_properties = resource_config.get('properties', {})
+        if resource_type == 'dnsrecord':
+            records_by_zone.setdefault(zone_index.resolve(resource_properties), []).append(
+                (resource_config, [record_set_from_properties(resource_properties)]))
+        elif resource_type == 'dns':
+            record_sets = [
+                record_set_from_properties({
+                    'zone_name': resource_properties['domain_name'],
+                    'record_type': record['type'],
+                    'ttl': record['ttl'],
+                    'values': record['values']
+                })
+                for record in resource_properties.get('records', [])
+            ]
+            hosted_zone_id = resource_properties.get('hosted_zone_id') or zone_index.get(resource_properties['domain_name'])
+            records_by_zone.setdefault(hosted_zone_id, []).append((resource_config, record_sets))
+
+    for hosted_zone_id, items in records_by_zone.items():
+        if not hosted_zone_id:
+            print(f"No hosted zone found for {', '.join(rc['name'] for rc, _ in items)}; skipping their records")
+            continue
+        print(f"Deleting {sum(len(record_sets) for _, record_sets in items)} DNS record(s) from hosted zone {hosted_zone_id}")
+        try:
+            current = list_record_sets(route53_client, hosted_zone_id)
+            managed = [record_key(record_set) for _, record_sets in items for record_set in record_sets]
+            submit_changes(route53_client, hosted_zone_id, diff_record_sets(current, [], managed))
+        except Exception as e:
+            print(f"Failed to delete DNS records from hosted zone {hosted_zone_id}: {e}")
+            continue
+        for resource_config, _ in items:
+            if resource_config['type'].lower() == 'dnsrecord':
+                update_state(state, resource_config, "delete")
+
+    for resource_config in resources:
         resource_type = resource_config['type'].lower()
-        resource_name = resource_config['name']
         resource_properties = resource_config.get('properties', {})
+        if resource_type not in ('dnszone', 'dns'):
+            continue
 
-        print(f"Deleting {resource_type}: {resource_name}")
-
-        if resource_type == 'dns':
-            print(f"Deleting DNS records for: {resource_name}")
-            # Deleting Route53Zone and Route53Record
-            zone = Route53Zone(resource_properties['domain_name'])
-            zone.hosted_zone_id = resource_properties['hosted_zone_id']
-            zone.delete(route53_client)
-            for record in resource_properties['records']:
-                record_obj = Route53Record(
-                    hosted_zone_id=zone.hosted_zone_id,
-                    zone_name=resource_properties['domain_name'],
-                    record_type=record['type'],
-                    ttl=record['ttl'],
-                    values=record['values']
-                )
-                record_obj.delete(route53_client)
+        print(f"Deleting {resource_type}: {resource_config['name']}")
+        zone = Route53Zone(resource_properties['domain_name'])
+        zone.hosted_zone_id = resource_properties.get('hosted_zone_id') or zone_index.get(resource_properties['domain_name'])
+        zone.delete(route53_client)
+        zone_index.remove(zone.hosted_zone_id)
 
         # Update state file after successful deletion
         # This will remove the resource from the state
         update_state(state, resource_config, "delete")
 
+    save_state(state)
     print("Infrastructure destruction process completed.")
 
 
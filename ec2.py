@@ -1,9 +1,10 @@
 import argparse
-from config_loader import load_infrastructure_config, load_user_settings
+from config_loader import load_infrastructure_config, load_user_settings, fleet_marker, resolve_parallelism
 from providers.aws import AWSProvider
-from state.state_manager import load_state, update_state
-from resources.aws.disk import create_and_attach_disk, delete_disk
-from resources.aws.vm import VM, wait_for_instance_running
+from state.state_manager import load_state, update_state, save_state
+from resources.aws.disk import create_and_attach_disks, delete_disk
+from resources.aws.vm import VM, launch_instances, iter_running_instances
+from deployments.scheduler import build_state_graph, run_graph, removed
 
 
 def deploy():
@@ -27,73 +28,129 @@ def deploy():
 
     vm_instance_ids = {}  # Store VM instance IDs by name
 
+    # Identical VMs (including count/for_each members) are launched with one run_instances call
+    vm_groups = {}
     for resource_config in infrastructure_config['resources']:
-        resource_type = resource_config['type'].lower()
-        
-        if resource_type == 'vm':      
+        if resource_config['type'].lower() == 'vm':
             vm_properties = resource_config['properties']
-            print(f"Creating VM: {resource_config['name']} with properties {vm_properties}")
-            vm = VM(
-                name=resource_config['name'],
-                image_id=vm_properties['image_id'],
-                instance_type=vm_properties['size'],
-                key_name=vm_properties['key_name'],
-                security_group_ids=[vm_properties['security_group']],
-                user_data_file=vm_properties.get('user_data_file')
+            spec = (
+                vm_properties['image_id'],
+                vm_properties['size'],
+                vm_properties['key_name'],
+                vm_properties['security_group'],
+                vm_properties.get('user_data_file'),
             )
-            instance_id = vm.create(ec2_client)
-
-            if instance_id:
-                print(f"Waiting for VM {resource_config['name']} to be running...")
-                if wait_for_instance_running(ec2_client, instance_id):
-                    print(f"VM {resource_config['name']} is running with Instance ID: {instance_id}")
-                else:
-                    print(f"VM {resource_config['name']} failed to start.")
-                    continue
-                vm_instance_ids[resource_config['name']] = instance_id
-                new_vm_state = {
-                    "type": "VM",
-                    "name": resource_config['name'],
-                    "properties": {
-                        "image_id": vm_properties['image_id'],
-                        "size": vm_properties['size'],
-                        "instance_id": instance_id,
-                        "key_name": vm_properties['key_name'],
-                        "security_group": vm_properties['security_group'],
-                        "status": "running",
-                        "availability_zone": vm_properties['availability_zone'],
-                        "public_ip": None,  # Will be updated later
-                        "private_ip": None,  # Will be updated later
-                        "user_data_file": vm_properties.get('user_data_file', "None")
-                    }
-                }
-                update_state(state, new_vm_state, "create")
+            vm_groups.setdefault(spec, []).append(resource_config)
+
+    launched = {}  # instance ID -> resource config
+    untagged = {}  # instance ID -> error, for instances whose Name tag could not be set
+    for (image_id, size, key_name, security_group, user_data_file), vm_configs in vm_groups.items():
+        names = [resource_config['name'] for resource_config in vm_configs]
+        print(f"Creating {len(names)} VM(s) from {image_id} ({size}): {', '.join(names)}")
+        instance_ids = launch_instances(
+            ec2_client,
+            names,
+            image_id=image_id,
+            instance_type=size,
+            key_name=key_name,
+            security_group_ids=[security_group],
+            user_data_file=user_data_file,
+            untagged=untagged
+        )
+        for resource_config in vm_configs:
+            if resource_config['name'] in instance_ids:
+                launched[instance_ids[resource_config['name']]] = resource_config
+
+    # One batched wait for every launch; each VM is recorded as soon as it is running
+    if launched:
+        print(f"Waiting for {len(launched)} VM(s) to be running...")
+    failed = {}
+    for instance in iter_running_instances(ec2_client, list(launched), failed=failed):
+        instance_id = instance['InstanceId']
+        resource_config = launched[instance_id]
+        vm_properties = resource_config['properties']
+        print(f"VM {resource_config['name']} is running with Instance ID: {instance_id}")
+        vm_instance_ids[resource_config['name']] = instance_id
+        new_vm_state = {
+            "type": "VM",
+            "name": resource_config['name'],
+            **fleet_marker(resource_config),
+            "properties": {
+                "image_id": vm_properties['image_id'],
+                "size": vm_properties['size'],
+                "instance_id": instance_id,
+                "key_name": vm_properties['key_name'],
+                "security_group": vm_properties['security_group'],
+                "status": "running",
+                "availability_zone": vm_properties['availability_zone'],
+                "public_ip": instance.get('PublicIpAddress'),
+                "private_ip": instance.get('PrivateIpAddress'),
+                "user_data_file": vm_properties.get('user_data_file', "None")
+            }
+        }
+        update_state(state, new_vm_state, "create")
+
+    for instance_id, resource_config in launched.items():
+        if resource_config['name'] not in vm_instance_ids:
+            reason = f": {failed[instance_id]}" if instance_id in failed else ""
+            print(f"VM {resource_config['name']} failed to start{reason}.")
+
+    # Disks for the VMs launched above are created, awaited and attached as one batch
+    disks = []
+    for resource_config in infrastructure_config['resources']:
+        resource_type = resource_config['type'].lower()
 
-                # Process disk resources for this VM
+        if resource_type == 'vm':
+            continue  # Launched above
         elif resource_type == 'disk':
             disk_properties = resource_config['properties']
             if disk_properties.get('vm_name') in vm_instance_ids:
-                instance_id = vm_instance_ids[disk_properties['vm_name']]
                 print(f"Attaching Disk: {resource_config['name']} to VM {disk_properties['vm_name']}")
-                disk_id, _ = create_and_attach_disk(aws_provider, disk_properties, instance_id)
-                if disk_id:
-                    new_disk_state = {
-                        "type": "Disk",
-                        "name": resource_config['name'],
-                        "properties": {
-                            "disk_id": disk_id,
-                            "attached_to_vm": instance_id,
-                            "size": disk_properties['size'],
-                            "status": "attached"
-                        }
-                    }
-                    update_state(state, new_disk_state, "create")
-                else:
-                    print(f"Failed to create and attach Disk: {resource_config['name']}")
-                    
+                # A volume an earlier run created but could not attach is reused
+                existing = state.find(resource_config['name'], 'Disk')
+                if existing and existing['properties'].get('disk_id') and not existing['properties'].get('attached_to_vm'):
+                    disk_properties = {**disk_properties, 'disk_id': existing['properties']['disk_id']}
+                disks.append((resource_config['name'], disk_properties, vm_instance_ids[disk_properties['vm_name']]))
         else:
             print(f"Unsupported resource type: {resource_type}")
 
+    created = {}
+    attached = create_and_attach_disks(ec2_client, disks, created=created) if disks else {}
+    for name, disk_properties, instance_id in disks:
+        if name not in attached:
+            print(f"Failed to create and attach Disk: {name}")
+            if name in created:
+                # Recorded unattached, so the next deploy reuses the volume and destroy deletes it
+                update_state(state, {
+                    "type": "Disk",
+                    "name": name,
+                    "properties": {
+                        "disk_id": created[name],
+                        "attached_to_vm": None,
+                        "size": disk_properties['size'],
+                        "status": "available"
+                    }
+                }, "create")
+            continue
+        disk_id, _ = attached[name]
+        new_disk_state = {
+            "type": "Disk",
+            "name": name,
+            "properties": {
+                "disk_id": disk_id,
+                "attached_to_vm": instance_id,
+                "size": disk_properties['size'],
+                "status": "attached"
+            }
+        }
+        update_state(state, new_disk_state, "create")
+
+    save_state(state)
+    if untagged:
+        # The instances are recorded in state (destroy can remove them), but are not findable by Name
+        for instance_id, error in untagged.items():
+            print(f"VM {launched[instance_id]['name']} ({instance_id}) was launched but its Name tag could not be set: {error}")
+        raise SystemExit(f"Deployment failed: {len(untagged)} VM(s) could not be tagged.")
     print("Infrastructure deployment process completed.")
     
 def destroy():
@@ -113,38 +170,50 @@ def destroy():
     # Creating the EC2 client
     ec2_client = aws_provider.client('ec2')
 
-    for resource_config in reversed(state.get('resources', [])):
-        resource_type = resource_config['type'].lower()
-        resource_name = resource_config['name']
-        resource_properties = resource_config.get('properties', {})
-
-        print(f"Deleting {resource_type}: {resource_name}")
-
-        try:
-            if resource_type == 'vm':
-                print(f"Deleting VM: {resource_name}")
-                vm_instance_id = resource_properties['instance_id']
-                vm = VM(
-                    name=resource_name,
-                    image_id=resource_properties['image_id'],
-                    instance_type=resource_properties['size'],
-                    key_name=resource_properties['key_name'],
-                    security_group_ids=[resource_properties['security_group']]
-                )
-                vm.delete(ec2_client, vm_instance_id)
-
-            elif resource_type == 'disk':
-                print(f"Deleting Disk: {resource_name}")
-                # Pass ec2_client directly to delete_disk function
-                delete_disk(ec2_client, resource_properties)
-
-            update_state(state, resource_config, "delete")
-
-        except Exception as e:
-            print(f"Failed to delete {resource_type} '{resource_name}': {e}")
+    # Disks are detached and deleted before the VMs they are attached to
+    resources = list(reversed(state.resources))
+    run_graph(
+        resources,
+        build_state_graph(state, resources),
+        lambda resource_config: _destroy_resource(resource_config, state, ec2_client),
+        resolve_parallelism(),
+        reverse=True,
+        check=removed(state),
+    )
 
+    save_state(state)
     print("Infrastructure destruction process completed.")
 
+def _destroy_resource(resource_config, state, ec2_client):
+    resource_type = resource_config['type'].lower()
+    resource_name = resource_config['name']
+    resource_properties = resource_config.get('properties', {})
+
+    print(f"Deleting {resource_type}: {resource_name}")
+
+    try:
+        if resource_type == 'vm':
+            print(f"Deleting VM: {resource_name}")
+            vm_instance_id = resource_properties['instance_id']
+            vm = VM(
+                name=resource_name,
+                image_id=resource_properties['image_id'],
+                instance_type=resource_properties['size'],
+                key_name=resource_properties['key_name'],
+                security_group_ids=[resource_properties['security_group']]
+            )
+            vm.delete(ec2_client, vm_instance_id)
+
+        elif resource_type == 'disk':
+            print(f"Deleting Disk: {resource_name}")
+            # Pass ec2_client directly to delete_disk function
+            delete_disk(ec2_client, resource_properties)
+
+        update_state(state, resource_config, "delete")
+
+    except Exception as e:
+        print(f"Failed to delete {resource_type} '{resource_name}': {e}")
+
 def main():
     parser = argparse.ArgumentParser(description="Pyraform - Infrastructure Management Tool")
     parser.add_argument("action", choices=["deploy", "destroy"], help="Action to perform")
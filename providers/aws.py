@@ -1,5 +1,7 @@
 import logging
+import threading
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from typing import Optional, Tuple, Dict, Any
 
@@ -8,7 +10,8 @@ from resources.aws.disk import create_and_attach_disk, delete_disk
 
 
 class AWSProvider:
-    def __init__(self, access_key: str, secret_key: str, region: str):
+    def __init__(self, access_key: str, secret_key: str, region: str, max_pool_connections: int = 50,
+                 retry_mode: str = 'adaptive', max_attempts: int = 10):
         self.access_key = access_key
         self.secret_key = secret_key
         self.region = region
@@ -17,15 +20,29 @@ class AWSProvider:
             aws_secret_access_key=self.secret_key,
             region_name=self.region,
         )
+        # Sized for parallel applies; adaptive retries absorb API throttling
+        self.config = Config(
+            max_pool_connections=max_pool_connections,
+            retries={'mode': retry_mode, 'max_attempts': max_attempts},
+        )
+        # Clients are costly to build (service models) but thread-safe once built: create each once
+        self._clients: Dict[Tuple[str, Optional[str], Optional[str]], Any] = {}
+        self._clients_lock = threading.Lock()
 
-    def client(self, service: str):
-        logging.getLogger(__name__).debug(f"Creating AWS client for service: {service}")
-        try:
-            return self.session.client(service)
-        except ClientError as e:
-            logging.getLogger(__name__).error(f"AWS Client Error creating {service} client: {e}")
-        except Exception as e:
-            logging.getLogger(__name__).error(f"Unexpected error creating {service} client: {e}")
+    def client(self, service: str, region: Optional[str] = None, endpoint_url: Optional[str] = None):
+        key = (service, region or self.region, endpoint_url)
+        with self._clients_lock:
+            if key in self._clients:
+                return self._clients[key]
+            logging.getLogger(__name__).debug(f"Creating AWS client for service: {service}")
+            try:
+                # boto3 sessions are not thread-safe, so creation stays under the lock
+                self._clients[key] = self.session.client(service, region_name=key[1], endpoint_url=endpoint_url, config=self.config)
+                return self._clients[key]
+            except ClientError as e:
+                logging.getLogger(__name__).error(f"AWS Client Error creating {service} client: {e}")
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Unexpected error creating {service} client: {e}")
         return None
 
     # Convenience helpers (optional usage)
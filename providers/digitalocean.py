@@ -1,6 +1,9 @@
 import logging
+import threading
 import digitalocean
 from digitalocean import DataReadError
+from resources.digitalocean.vm import DropletPoller
+from resources.digitalocean.tags import TagBatcher
 
 class DigitalOceanProvider:
     def __init__(self, token):
@@ -10,6 +13,15 @@ class DigitalOceanProvider:
         """
         self.token = token
         self.manager = digitalocean.Manager(token=self.token)
+        # Shared by all droplet creates in a run: one list call per cycle instead of one loop per droplet
+        self.droplet_poller = DropletPoller(self.manager)
+        # Droplet tag changes are collected during the run and applied once per tag
+        self.tag_batcher = TagBatcher(self.token)
+        # Per-run lookup cache: each collection is listed once and indexed by name
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
 
     def client(self, service):
         """
@@ -20,6 +32,45 @@ class DigitalOceanProvider:
         logging.getLogger(__name__).debug("DigitalOcean uses a single manager for all operations.")
         return self.manager
 
+    def _collection(self, kind):
+        """Return {name: object} for 'droplets', 'sshkeys' or 'domains', listing the account once."""
+        listers = {
+            'droplets': self.manager.get_all_droplets,
+            'sshkeys': self.manager.get_all_sshkeys,
+            'domains': self.manager.get_all_domains,
+        }
+        with self._cache_lock:
+            if kind in self._cache:
+                self._hits += 1
+                return self._cache[kind]
+            self._misses += 1
+            items = listers[kind]()
+            self._cache[kind] = {item.name: item for item in items}
+            return self._cache[kind]
+
+    def cache_add(self, kind, obj):
+        """Record an object pyraform just created, if that collection is already cached."""
+        with self._cache_lock:
+            if kind in self._cache and getattr(obj, 'name', None):
+                self._cache[kind][obj.name] = obj
+
+    def cache_remove(self, kind, name=None, id=None):
+        """Drop an object pyraform just deleted, by name or ID."""
+        with self._cache_lock:
+            entries = self._cache.get(kind)
+            if not entries:
+                return
+            for key, obj in list(entries.items()):
+                if (name is not None and key == name) or (id is not None and str(getattr(obj, 'id', None)) == str(id)):
+                    del entries[key]
+
+    def ids_by_name(self, kind):
+        """Return {name: id} for a cached collection, listing it at most once per run."""
+        return {name: obj.id for name, obj in self._collection(kind).items()}
+
+    def cache_stats(self):
+        return {'hits': self._hits, 'misses': self._misses}
+
     def get_ssh_key_id(self, ssh_key_name):
         """
         Retrieve the ID of an SSH key from DigitalOcean by its name.
@@ -27,10 +78,9 @@ class DigitalOceanProvider:
         :return: SSH key ID or None if not found.
         """
         try:
-            ssh_keys = self.manager.get_all_sshkeys()
-            for key in ssh_keys:
-                if key.name == ssh_key_name:
-                    return key.id
+            key = self._collection('sshkeys').get(ssh_key_name)
+            if key is not None:
+                return key.id
             logging.getLogger(__name__).warning(f"SSH key named '{ssh_key_name}' not found.")
         except DataReadError as e:
             logging.getLogger(__name__).error(f"Error reading SSH keys: {e}")
@@ -39,9 +89,9 @@ class DigitalOceanProvider:
     def get_droplet_id_by_name(self, name):
         """Return droplet ID by name, or None if not found."""
         try:
-            for droplet in self.manager.get_all_droplets():
-                if droplet.name == name:
-                    return droplet.id
+            droplet = self._collection('droplets').get(name)
+            if droplet is not None:
+                return droplet.id
         except Exception as e:
             logging.getLogger(__name__).error(f"Error listing droplets: {e}")
         return None
@@ -49,10 +99,7 @@ class DigitalOceanProvider:
     def get_domain(self, domain_name):
         """Return a Domain object if it exists, else None."""
         try:
-            domains = self.manager.get_all_domains()
-            for d in domains:
-                if d.name == domain_name:
-                    return d
+            return self._collection('domains').get(domain_name)
         except Exception as e:
             logging.getLogger(__name__).error(f"Error listing domains: {e}")
         return None
@@ -1,36 +1,139 @@
 import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
 import requests
+from requests.adapters import HTTPAdapter
+
+# Verbs that are safe to resend after a 5xx or a dropped connection.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
 
 
 class VultrProvider:
     """Lightweight Vultr API v2 client for common operations."""
 
-    def __init__(self, api_key: str, base_url: str = "https://api.vultr.com/v2"):
+    def __init__(self, api_key: str, base_url: str = "https://api.vultr.com/v2", per_page: int = 100,
+                 timeout: float | tuple = (5, 30), max_retries: int = 5, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, pool_size: int = 32):
         self.base_url = base_url.rstrip("/")
+        self.per_page = per_page
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
         self.session = requests.Session()
         self.session.headers.update({
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         })
-
-    def _req(self, method: str, path: str, **kwargs):
+        # Pooled keep-alive connections, sized for concurrent applies
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._stats = {"requests": 0, "retries": 0, "throttled": 0, "throttle_wait": 0.0}
+        self._stats_lock = threading.Lock()
+        self._ssh_key_ids = {}
+
+    def request_stats(self):
+        """Return counters for requests, retries, 429 responses and seconds spent waiting on them."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, key: str, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads out retries from concurrent workers
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(resp) -> float | None:
+        value = resp.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _req(self, method: str, path: str, timeout=None, **kwargs):
+        """Send a request with timeouts, retrying throttled and transient failures.
+
+        429 responses are retried for every verb (the request was rejected, not
+        applied) after ``Retry-After`` or a jittered backoff. 5xx responses and
+        connection errors are retried only for idempotent verbs.
+        """
+        log = logging.getLogger(__name__)
         url = f"{self.base_url}{path}"
-        resp = self.session.request(method, url, **kwargs)
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self._count("requests")
+            try:
+                resp = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                log.warning(f"Vultr {method} {path} failed ({e}); retrying in {delay:.1f}s")
+            else:
+                if resp.status_code == 429 and attempt < self.max_retries:
+                    delay = self._retry_after(resp)
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    self._count("throttled")
+                    self._count("throttle_wait", delay)
+                    log.debug(f"Vultr API throttled {method} {path}; waiting {delay:.1f}s")
+                elif resp.status_code in RETRY_STATUSES and idempotent and attempt < self.max_retries:
+                    delay = self._backoff(attempt)
+                    log.warning(f"Vultr API error {resp.status_code} on {method} {path}; retrying in {delay:.1f}s")
+                else:
+                    break
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
         if not resp.ok:
-            logging.getLogger(__name__).error(f"Vultr API error {resp.status_code}: {resp.text}")
+            log.error(f"Vultr API error {resp.status_code}: {resp.text}")
             resp.raise_for_status()
         return resp.json() if resp.text else {}
 
+    def _paginate(self, path: str, key: str, params: dict | None = None):
+        """Yield items from a list endpoint lazily, following ``meta.links.next`` cursors."""
+        params = {**(params or {}), "per_page": self.per_page}
+        while True:
+            data = self._req("GET", path, params=params)
+            yield from data.get(key, [])
+            cursor = ((data.get("meta") or {}).get("links") or {}).get("next")
+            if not cursor:
+                return
+            params["cursor"] = cursor
+
     # SSH Keys
+    def iter_ssh_keys(self):
+        return self._paginate("/ssh-keys", "ssh_keys")
+
     def list_ssh_keys(self):
-        return self._req("GET", "/ssh-keys").get("ssh_keys", [])
+        return list(self.iter_ssh_keys())
 
     def find_ssh_key_id(self, name_or_id: str):
         # If an exact UUID is provided, return it directly
         if len(name_or_id) in (24, 36):  # heuristic
             return name_or_id
-        for key in self.list_ssh_keys():
+        # Fleet members share keys: resolve each name once per run
+        if name_or_id in self._ssh_key_ids:
+            return self._ssh_key_ids[name_or_id]
+        for key in self.iter_ssh_keys():
             if key.get("name") == name_or_id or key.get("label") == name_or_id:
+                self._ssh_key_ids[name_or_id] = key.get("id")
                 return key.get("id")
         logging.getLogger(__name__).warning(f"SSH key '{name_or_id}' not found in Vultr")
         return None
@@ -62,11 +165,14 @@ class VultrProvider:
         data = self._req("POST", "/instances", json=payload)
         return data.get("instance")
 
+    def iter_instances(self):
+        return self._paginate("/instances", "instances")
+
     def list_instances(self):
-        return self._req("GET", "/instances").get("instances", [])
+        return list(self.iter_instances())
 
     def find_instance_by_label(self, label: str):
-        for ins in self.list_instances():
+        for ins in self.iter_instances():
             if ins.get("label") == label:
                 return ins
         return None
@@ -88,8 +194,11 @@ class VultrProvider:
         return self._req("PATCH", f"/instances/{instance_id}", json=payload)
 
     # Domains
+    def iter_domains(self):
+        return self._paginate("/domains", "domains")
+
     def list_domains(self):
-        return self._req("GET", "/domains").get("domains", [])
+        return list(self.iter_domains())
 
     def create_domain(self, domain: str, ip: str | None = None):
         payload = {"domain": domain}
@@ -101,8 +210,11 @@ class VultrProvider:
         self._req("DELETE", f"/domains/{domain}")
         return True
 
+    def iter_records(self, domain: str):
+        return self._paginate(f"/domains/{domain}/records", "records")
+
     def list_records(self, domain: str):
-        return self._req("GET", f"/domains/{domain}/records").get("records", [])
+        return list(self.iter_records(domain))
 
     def create_record(self, domain: str, *, type: str, name: str, data: str, ttl: int | None = None, priority: int | None = None):
         payload = {"type": type, "name": name, "data": data}
@@ -112,6 +224,12 @@ class VultrProvider:
             payload["priority"] = priority
         return self._req("POST", f"/domains/{domain}/records", json=payload).get("record")
 
+    def update_record(self, domain: str, record_id: str, *, name: str | None = None, data: str | None = None,
+                      ttl: int | None = None, priority: int | None = None):
+        payload = {k: v for k, v in {"name": name, "data": data, "ttl": ttl, "priority": priority}.items() if v is not None}
+        self._req("PATCH", f"/domains/{domain}/records/{record_id}", json=payload)
+        return True
+
     def delete_record(self, domain: str, record_id: str):
         self._req("DELETE", f"/domains/{domain}/records/{record_id}")
         return True
@@ -134,8 +252,11 @@ class VultrProvider:
         return True
 
     # Firewall Groups & Rules
+    def iter_firewall_groups(self):
+        return self._paginate("/firewall-groups", "firewall_groups")
+
     def list_firewall_groups(self):
-        return self._req("GET", "/firewall-groups").get("firewall_groups", [])
+        return list(self.iter_firewall_groups())
 
     def create_firewall_group(self, description: str):
         return self._req("POST", "/firewall-groups", json={"description": description}).get("firewall_group")
@@ -144,8 +265,11 @@ class VultrProvider:
         self._req("DELETE", f"/firewall-groups/{group_id}")
         return True
 
+    def iter_firewall_rules(self, group_id: str):
+        return self._paginate(f"/firewall-groups/{group_id}/rules", "rules")
+
     def list_firewall_rules(self, group_id: str):
-        return self._req("GET", f"/firewall-groups/{group_id}/rules").get("rules", [])
+        return list(self.iter_firewall_rules(group_id))
 
     def create_firewall_rule(self, group_id: str, *, protocol: str, ip_type: str, subnet: str, subnet_size: int, port: str | None = None):
         payload = {
@@ -276,10 +400,8 @@ class VultrProvider:
 
     # Object Storage (S3 compatible) - via boto3 like DO Spaces
     def s3_client(self, *, region: str, access_key: str, secret_key: str):
-        import boto3
-        endpoint = f"https://{region}.vultrobjects.com"
-        return boto3.client('s3', region_name=region, endpoint_url=endpoint,
-                            aws_access_key_id=access_key, aws_secret_access_key=secret_key)
+        from resources.object_storage import s3_client
+        return s3_client(f"https://{region}.vultrobjects.com", region, access_key, secret_key)
 
     # Startup Scripts & SSH Keys
     def create_startup_script(self, name: str, script: str, script_type: str = "boot"):
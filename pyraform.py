@@ -15,12 +15,15 @@ def confirm_action(prompt):
 
 def main():
     parser = argparse.ArgumentParser(description="Pyraform - Multi-cloud Infrastructure Management Tool")
-    parser.add_argument("action", choices=["deploy", "destroy", "plan"], help="Action to perform")
+    parser.add_argument("action", choices=["deploy", "destroy", "plan", "migrate-state"], help="Action to perform")
     parser.add_argument("--settings", dest="settings", help="Path to settings.yml", required=False)
     parser.add_argument("--infrastructure", dest="infrastructure", help="Path to infrastructure.yml", required=False)
     parser.add_argument("--provider", dest="provider", help="Provider override (e.g., do, aws)", required=False)
     parser.add_argument("--auto-approve", dest="auto_approve", help="Skip interactive approvals", action="store_true")
     parser.add_argument("--verbose", dest="verbose", help="Verbose logging", action="store_true")
+    parser.add_argument("--parallelism", dest="parallelism", type=int, help="Max resources applied concurrently (default 10)", required=False)
+    parser.add_argument("--to", dest="to_backend", choices=["json", "sqlite"], help="Target state backend for migrate-state", required=False)
+    parser.add_argument("--force", dest="force", help="Let migrate-state overwrite a target that already holds state", action="store_true")
     args = parser.parse_args()
 
     # Logging setup
@@ -32,6 +35,22 @@ def main():
         os.environ['PYRAFORM_SETTINGS'] = args.settings
     if args.infrastructure:
         os.environ['PYRAFORM_INFRA'] = args.infrastructure
+    if args.parallelism:
+        os.environ['PYRAFORM_PARALLELISM'] = str(args.parallelism)
+
+    if args.action == "migrate-state":
+        if not args.to_backend:
+            logger.error("migrate-state requires --to json|sqlite")
+            return
+        from state.state_manager import migrate_state, state_paths
+        try:
+            migrate_state(args.to_backend, force=args.force)
+        except (OSError, ValueError) as e:
+            logger.error(f"migrate-state failed: {e}")
+            return
+        logger.info(f"Set 'state_backend: {args.to_backend}' and 'state_file: {state_paths()[args.to_backend]}' "
+                    f"in settings.yml to use the migrated state.")
+        return
 
     # Load user settings which includes the provider
     user_settings = load_user_settings()
@@ -1,5 +1,7 @@
 import boto3
-from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError, WaiterError
+from config_loader import resolve_parallelism
 
 def create_and_attach_disk(aws_provider, disk_properties, vm_instance_id):
     """
@@ -10,31 +12,81 @@ def create_and_attach_disk(aws_provider, disk_properties, vm_instance_id):
     :param vm_instance_id: The ID of the EC2 instance to attach the disk to
     :return: A tuple of (disk_id, attachment_info), or (None, None) if unsuccessful
     """
-    ec2_client = aws_provider.client('ec2')
+    results = create_and_attach_disks(aws_provider.client('ec2'), [(None, disk_properties, vm_instance_id)])
+    return results.get(None, (None, None))
+
+def create_and_attach_disks(ec2_client, disks, parallelism=None, created=None):
+    """
+    Create and attach many EBS volumes at once.
+
+    Every create_volume call is issued up front, a single volume_available
+    waiter covers all new volume IDs, and the attachments then run concurrently.
+    A disk whose properties already carry a disk_id (a volume left unattached
+    by an earlier run) reuses that volume instead of creating a new one.
+
+    :param ec2_client: Boto3 EC2 client, shared by all calls
+    :param disks: List of (key, disk_properties, vm_instance_id)
+    :param parallelism: Maximum concurrent API calls (defaults to PYRAFORM_PARALLELISM)
+    :param created: Optional dict filled with key -> volume ID for every volume
+        created or reused, including those that could not be attached.
+    :return: Dict of key -> (disk_id, attachment_info) for the disks that were attached
+    """
+    workers = resolve_parallelism(parallelism)
+
+    def _create(disk):
+        key, disk_properties, vm_instance_id = disk
+        if disk_properties.get('disk_id'):
+            print(f"Reusing volume {disk_properties['disk_id']} for {vm_instance_id}")
+            return disk_properties['disk_id']
+        try:
+            volume_response = ec2_client.create_volume(
+                Size=disk_properties['size'],
+                VolumeType=disk_properties['volume_type'],
+                AvailabilityZone=disk_properties['availability_zone']  # Assume same AZ as VM
+            )
+            print(f"Volume {volume_response['VolumeId']} created for {vm_instance_id}")
+            return volume_response['VolumeId']
+        except ClientError as e:
+            print(f"Error creating disk: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        volume_ids = list(pool.map(_create, disks))
+    pending = [(disk, volume_id) for disk, volume_id in zip(disks, volume_ids) if volume_id]
+    if created is not None:
+        created.update((disk[0], volume_id) for disk, volume_id in pending)
+    if not pending:
+        return {}
+
+    # Wait for all volumes to be available before attaching
     try:
-        # Create EBS volume
-        volume_response = ec2_client.create_volume(
-            Size=disk_properties['size'],
-            VolumeType=disk_properties['volume_type'],
-            AvailabilityZone=disk_properties['availability_zone']  # Assume same AZ as VM
-        )
-        volume_id = volume_response['VolumeId']
-        print(f"Volume {volume_id} created, now attaching to {vm_instance_id}")
-
-        # Wait for the volume to be available before attaching
-        ec2_client.get_waiter('volume_available').wait(VolumeIds=[volume_id])
-
-        # Attach the volume to the EC2 instance
-        attach_response = ec2_client.attach_volume(
-            VolumeId=volume_id,
-            InstanceId=vm_instance_id,
-            Device=disk_properties['device_name']
-        )
-        print(f"Volume {volume_id} attached to {vm_instance_id}")
-        return volume_id, attach_response
-    except ClientError as e:
-        print(f"Error creating or attaching disk: {e}")
-        return None, None
+        ec2_client.get_waiter('volume_available').wait(VolumeIds=[volume_id for _, volume_id in pending])
+    except WaiterError as e:
+        print(f"Not all volumes became available: {e}")
+        try:
+            response = ec2_client.describe_volumes(VolumeIds=[volume_id for _, volume_id in pending])
+            available = {v['VolumeId'] for v in response['Volumes'] if v['State'] == 'available'}
+        except ClientError as e:
+            print(f"Error describing volumes: {e}")
+            available = set()
+        pending = [(disk, volume_id) for disk, volume_id in pending if volume_id in available]
+
+    def _attach(item):
+        (key, disk_properties, vm_instance_id), volume_id = item
+        try:
+            attach_response = ec2_client.attach_volume(
+                VolumeId=volume_id,
+                InstanceId=vm_instance_id,
+                Device=disk_properties['device_name']
+            )
+            print(f"Volume {volume_id} attached to {vm_instance_id}")
+            return key, (volume_id, attach_response)
+        except ClientError as e:
+            print(f"Error attaching disk {volume_id}: {e}")
+            return key, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return {key: result for key, result in pool.map(_attach, pending) if result}
 
 def delete_disk(ec2_client, disk_properties):
     """
@@ -44,12 +96,14 @@ def delete_disk(ec2_client, disk_properties):
     :param disk_properties: Properties for the disk, e.g., disk_id
     """
     try:
-        # Detach the volume from the EC2 instance
-        ec2_client.detach_volume(VolumeId=disk_properties['disk_id'])
-        print(f"Volume {disk_properties['disk_id']} detached from {disk_properties['attached_to_vm']}")
+        # Volumes left unattached by a failed deploy have nothing to detach
+        if disk_properties.get('attached_to_vm'):
+            # Detach the volume from the EC2 instance
+            ec2_client.detach_volume(VolumeId=disk_properties['disk_id'])
+            print(f"Volume {disk_properties['disk_id']} detached from {disk_properties['attached_to_vm']}")
 
-        # Wait for the volume to be detached before deleting
-        ec2_client.get_waiter('volume_available').wait(VolumeIds=[disk_properties['disk_id']])
+            # Wait for the volume to be detached before deleting
+            ec2_client.get_waiter('volume_available').wait(VolumeIds=[disk_properties['disk_id']])
 
         # Delete the volume
         ec2_client.delete_volume(VolumeId=disk_properties['disk_id'])
@@ -1,5 +1,6 @@
 import boto3
 from botocore.exceptions import ClientError
+import threading
 import uuid
 from botocore.exceptions import ClientError
 
@@ -87,20 +88,218 @@ class Route53Record:
         except ClientError as e:
             print(f"Error deleting record set for {self.zone_name}: {e.response['Error']['Message']}")
                         
-def fetch_hosted_zone_id(route53_client, domain_name):
+class HostedZoneIndex:
+    """
+    Per-run index of hosted zone names to IDs, built from one paginated list_hosted_zones.
+    Shared by dns.deploy(), dns.destroy() and the Route53 handlers so zones are listed once.
+    """
+    def __init__(self, route53_client):
+        self.route53_client = route53_client
+        self._zones = None  # fqdn -> list of {'id', 'private'}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._zones is None:
+                zones = {}
+                paginator = self.route53_client.get_paginator('list_hosted_zones')
+                for page in paginator.paginate():
+                    for zone in page['HostedZones']:
+                        zones.setdefault(_fqdn(zone['Name']), []).append({
+                            'id': zone['Id'].split('/')[-1],
+                            'private': bool(zone.get('Config', {}).get('PrivateZone')),
+                        })
+                self._zones = zones
+                print(f"Indexed {sum(len(v) for v in zones.values())} hosted zone(s)")
+        return self._zones
+
+    def get(self, domain_name, private=None):
+        """
+        Return the hosted zone ID for a domain name, or None.
+        :param private: True/False to pick the private or public zone when both exist; by default public wins.
+        """
+        candidates = self._load().get(_fqdn(domain_name), [])
+        if private is not None:
+            candidates = [zone for zone in candidates if zone['private'] == bool(private)]
+        if len(candidates) > 1:
+            public = [zone for zone in candidates if not zone['private']]
+            if private is None and len(public) == 1:
+                return public[0]['id']
+            print(f"Several hosted zones are named {domain_name}; using {candidates[0]['id']}. Set zone_id to choose one.")
+        return candidates[0]['id'] if candidates else None
+
+    def resolve(self, record_properties):
+        """Return the hosted zone for record properties: explicit zone_id, then zone_name, then the closest parent of name."""
+        if record_properties.get('zone_id'):
+            return record_properties['zone_id'].split('/')[-1]
+        if record_properties.get('hosted_zone_id'):
+            return record_properties['hosted_zone_id']
+        private = record_properties.get('private_zone')
+        if record_properties.get('zone_name'):
+            return self.get(record_properties['zone_name'], private)
+        labels = _fqdn(record_properties['name']).rstrip('.').split('.')
+        for i in range(len(labels) - 1):
+            hosted_zone_id = self.get('.'.join(labels[i:]), private)
+            if hosted_zone_id:
+                return hosted_zone_id
+        return None
+
+    def add(self, domain_name, hosted_zone_id, private=False):
+        hosted_zone_id = hosted_zone_id.split('/')[-1]
+        # The first lookup may list the account after the zone was created, so it can already be indexed
+        zones = self._load()
+        with self._lock:
+            entries = zones.setdefault(_fqdn(domain_name), [])
+            if not any(zone['id'] == hosted_zone_id for zone in entries):
+                entries.append({'id': hosted_zone_id, 'private': bool(private)})
+
+    def remove(self, hosted_zone_id):
+        zones = self._load()
+        with self._lock:
+            for name in list(zones):
+                zones[name] = [zone for zone in zones[name] if zone['id'] != hosted_zone_id]
+                if not zones[name]:
+                    del zones[name]
+
+
+def fetch_hosted_zone_id(route53_client, domain_name, zone_index=None, private=None):
     """
     Fetch the hosted zone ID for the specified domain name.
     
     :param route53_client: Boto3 Route53 client.
     :param domain_name: The domain name to find the hosted zone for.
+    :param zone_index: Shared HostedZoneIndex; pass one to avoid listing zones again.
+    :param private: Prefer the private (True) or public (False) zone when both exist.
     :return: The hosted zone ID, or None if not found.
     """
     try:
-        response = route53_client.list_hosted_zones_by_name(DNSName=domain_name)
-        for zone in response['HostedZones']:
-            if zone['Name'] == f"{domain_name}.":
-                return zone['Id'].split('/')[-1]
+        return (zone_index or HostedZoneIndex(route53_client)).get(domain_name, private)
     except ClientError as e:
         print(f"Error fetching hosted zone ID for {domain_name}: {e.response['Error']['Message']}")
     return None
 
+
+# Route53 accepts at most 1000 ResourceRecord values per ChangeBatch (an UPSERT counts twice).
+CHANGE_BATCH_LIMIT = 1000
+
+
+def _fqdn(name):
+    """Normalize a record name the way Route53 returns it: lowercase, trailing dot, unescaped '*'."""
+    name = str(name).replace('\\052', '*').lower()
+    return name if name.endswith('.') else f"{name}."
+
+
+def record_key(record_set):
+    return (_fqdn(record_set['Name']), record_set['Type'].upper(), record_set.get('SetIdentifier'))
+
+
+def record_set_from_properties(properties):
+    """
+    Build a ResourceRecordSet from route53_record properties.
+    Both schemas are accepted: name/type/records (+ zone_id) and zone_name/record_type/values.
+    """
+    return {
+        'Name': _fqdn(properties.get('name') or properties['zone_name']),
+        'Type': str(properties.get('type') or properties['record_type']).upper(),
+        'TTL': int(properties.get('ttl', 300)),
+        'ResourceRecords': [{'Value': str(value)} for value in (properties.get('records') or properties.get('values') or [])],
+    }
+
+
+def list_record_sets(route53_client, hosted_zone_id):
+    """
+    List every record set in a hosted zone, following pagination.
+    :return: Dict of record_key() -> ResourceRecordSet.
+    """
+    record_sets = {}
+    paginator = route53_client.get_paginator('list_resource_record_sets')
+    for page in paginator.paginate(HostedZoneId=hosted_zone_id):
+        for record_set in page['ResourceRecordSets']:
+            record_sets[record_key(record_set)] = record_set
+    return record_sets
+
+
+def _same_record_set(current, desired):
+    return (current.get('TTL') == desired['TTL']
+            and 'AliasTarget' not in current
+            and sorted(r['Value'] for r in current.get('ResourceRecords', [])) == sorted(r['Value'] for r in desired['ResourceRecords']))
+
+
+def diff_record_sets(current, desired, managed=()):
+    """
+    Compute the minimal change list that turns the zone into the desired records.
+    :param current: Dict from list_record_sets().
+    :param desired: List of ResourceRecordSets from configuration.
+    :param managed: Keys of records pyraform created earlier; only these are deleted when no longer desired.
+    :return: List of Route53 changes (CREATE / UPSERT / DELETE).
+    """
+    changes = []
+    wanted = set()
+    for record_set in desired:
+        key = record_key(record_set)
+        wanted.add(key)
+        existing = current.get(key)
+        if existing is None:
+            changes.append({'Action': 'CREATE', 'ResourceRecordSet': record_set})
+        elif not _same_record_set(existing, record_set):
+            changes.append({'Action': 'UPSERT', 'ResourceRecordSet': record_set})
+    for key in managed:
+        if key not in wanted and key in current:
+            # DELETE must match the live record set exactly
+            changes.append({'Action': 'DELETE', 'ResourceRecordSet': current[key]})
+    return changes
+
+
+def _batches(changes, limit=CHANGE_BATCH_LIMIT):
+    batch, size = [], 0
+    for change in changes:
+        weight = max(1, len(change['ResourceRecordSet'].get('ResourceRecords', []))) * (2 if change['Action'] == 'UPSERT' else 1)
+        if batch and (len(batch) >= limit or size + weight > limit):
+            yield batch
+            batch, size = [], 0
+        batch.append(change)
+        size += weight
+    if batch:
+        yield batch
+
+
+def submit_changes(route53_client, hosted_zone_id, changes, wait=True):
+    """
+    Submit changes in as few ChangeBatches as the API limits allow.
+    Batches are applied in order, so waiting on the last change ID covers the whole sync.
+    :return: The last change ID, or None if nothing was submitted.
+    """
+    change_id = None
+    for batch in _batches(changes):
+        try:
+            response = route53_client.change_resource_record_sets(
+                HostedZoneId=hosted_zone_id,
+                ChangeBatch={'Comment': 'pyraform sync', 'Changes': batch}
+            )
+            change_id = response['ChangeInfo']['Id']
+            print(f"Submitted {len(batch)} record change(s) to hosted zone {hosted_zone_id}: {change_id}")
+        except ClientError as e:
+            print(f"Error applying record changes to hosted zone {hosted_zone_id}: {e.response['Error']['Message']}")
+            raise
+    if wait and change_id:
+        route53_client.get_waiter('resource_record_sets_changed').wait(Id=change_id)
+        print(f"Record changes for hosted zone {hosted_zone_id} are in sync")
+    return change_id
+
+
+def sync_zone_records(route53_client, hosted_zone_id, desired, managed=(), wait=True):
+    """
+    Reconcile a hosted zone: one paginated listing, a diff, then batched changes.
+    :return: The list of changes that were applied.
+    """
+    current = list_record_sets(route53_client, hosted_zone_id)
+    changes = diff_record_sets(current, desired, managed)
+    if not changes:
+        print(f"Hosted zone {hosted_zone_id} already matches configuration")
+        return []
+    summary = {}
+    for change in changes:
+        summary[change['Action']] = summary.get(change['Action'], 0) + 1
+    print(f"Syncing hosted zone {hosted_zone_id}: {', '.join(f'{n} {a}' for a, n in summary.items())}")
+    submit_changes(route53_client, hosted_zone_id, changes, wait=wait)
+    return changes
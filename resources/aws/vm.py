@@ -1,6 +1,9 @@
 import boto3
 from botocore.exceptions import ClientError
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
+from config_loader import read_user_data, resolve_parallelism
 
 class VM:
     def __init__(self, name, image_id, instance_type, key_name, security_group_ids, user_data_file=None):
@@ -33,13 +36,13 @@ class VM:
             print("AWS client not available. Cannot create VM.")
             return
 
-        try:
-            response = ec2_client.run_instances(
-                ImageId=self.image_id,
-                InstanceType=self.instance_type,
-                KeyName=self.key_name,
-                SecurityGroupIds=self.security_group_ids,
-                MinCount=1,
+        try:
+            response = ec2_client.run_instances(
+                ImageId=self.image_id,
+                InstanceType=self.instance_type,
+                KeyName=self.key_name,
+                SecurityGroupIds=self.security_group_ids,
+                MinCount=1,
                 MaxCount=1,
                 TagSpecifications=[
                     {
@@ -70,8 +73,168 @@ class VM:
             print(f"VM '{instance_id}' terminated successfully.")
         except ClientError as e:
             print(f"Failed to terminate VM '{instance_id}': {e}")
-    
-    
+
+
+def launch_instances(ec2_client, names, image_id, instance_type, key_name, security_group_ids, user_data_file=None, untagged=None):
+    """
+    Launch one EC2 instance per name with a single run_instances call.
+    A single name is tagged at launch; otherwise the launch carries no Name (so
+    no instance is ever shown under another's name) and the Names are set right
+    after in one concurrent pass, see tag_instances().
+    :param ec2_client: Boto3 EC2 client.
+    :param names: Names for the instances; each becomes that instance's Name tag.
+    :param untagged: Optional dict filled with instance ID -> error for launched
+        instances whose Name tag could not be set.
+    :return: Dict of name -> instance ID (empty on failure).
+    """
+    user_data = read_user_data(user_data_file) if user_data_file else ''
+    params = {}
+    if len(set(names)) == 1:
+        params['TagSpecifications'] = [
+            {
+                'ResourceType': 'instance',
+                'Tags': [{'Key': 'Name', 'Value': names[0]}]
+            }
+        ]
+    try:
+        response = ec2_client.run_instances(
+            ImageId=image_id,
+            InstanceType=instance_type,
+            KeyName=key_name,
+            SecurityGroupIds=security_group_ids,
+            MinCount=len(names),
+            MaxCount=len(names),
+            UserData=user_data,
+            **params
+        )
+    except Exception as e:
+        print(f"Failed to launch VMs {', '.join(names)}: {e}")
+        return {}
+
+    launched = list(zip(names, [instance['InstanceId'] for instance in response['Instances']]))
+    if 'TagSpecifications' not in params:
+        errors = tag_instances(ec2_client, launched)
+        if untagged is not None:
+            untagged.update(errors)
+    instance_ids = dict(launched)
+    print(f"Launched {len(instance_ids)} VM(s): {', '.join(f'{n} ({i})' for n, i in instance_ids.items())}")
+    return instance_ids
+
+
+# create_tags accepts up to this many resource IDs per call.
+CREATE_TAGS_CHUNK = 1000
+
+# IDs of just-launched instances can take a few seconds to become visible to
+# create_tags; InvalidInstanceID.NotFound is retried this many times.
+CREATE_TAGS_ATTEMPTS = 6
+
+
+def tag_instances(ec2_client, named_ids, parallelism=None, base_delay=1, max_delay=15):
+    """
+    Set the Name tag of many instances in one pass.
+    Instances sharing a Name are tagged together in chunks of CREATE_TAGS_CHUNK;
+    create_tags applies the same tags to every resource in a call, so each
+    distinct Name needs its own call, and those calls run concurrently. Calls
+    failing with InvalidInstanceID.NotFound (new IDs not visible yet) are
+    retried with jittered exponential backoff.
+    :param named_ids: Iterable of (name, instance ID).
+    :return: Dict of instance ID -> error for the instances left untagged.
+    """
+    by_name = {}
+    for name, instance_id in named_ids:
+        by_name.setdefault(name, []).append(instance_id)
+    calls = [(name, ids[start:start + CREATE_TAGS_CHUNK])
+             for name, ids in by_name.items()
+             for start in range(0, len(ids), CREATE_TAGS_CHUNK)]
+
+    def _tag(call):
+        name, ids = call
+        for attempt in range(CREATE_TAGS_ATTEMPTS):
+            try:
+                ec2_client.create_tags(Resources=ids, Tags=[{'Key': 'Name', 'Value': name}])
+                return {}
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code')
+                if code != 'InvalidInstanceID.NotFound' or attempt == CREATE_TAGS_ATTEMPTS - 1:
+                    print(f"Failed to tag instance(s) {', '.join(ids)} as '{name}': {e}")
+                    return {instance_id: str(e) for instance_id in ids}
+                time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+    untagged = {}
+    if not calls:
+        return untagged
+    with ThreadPoolExecutor(max_workers=min(len(calls), resolve_parallelism(parallelism))) as pool:
+        for errors in pool.map(_tag, calls):
+            untagged.update(errors)
+    return untagged
+
+
+# describe_instances accepts up to this many IDs per call.
+DESCRIBE_CHUNK = 1000
+
+# States a launching instance never leaves for 'running'.
+FAILED_STATES = ('shutting-down', 'terminated', 'stopping', 'stopped')
+
+
+def iter_running_instances(ec2_client, instance_ids, timeout=600, min_interval=2, max_interval=15, failed=None):
+    """
+    Wait for many EC2 instances, yielding each one as soon as it is running.
+    IDs are queried with describe_instances in chunks of DESCRIBE_CHUNK. The poll
+    interval starts at min_interval and backs off towards max_interval while
+    nothing new is running. Instances that end up shutting down, terminated or
+    stopped are dropped from the wait as soon as they are seen.
+    :param ec2_client: Boto3 EC2 client.
+    :param instance_ids: IDs of the EC2 instances.
+    :param timeout: Maximum time to wait (in seconds).
+    :param failed: Optional dict that receives instance ID -> reason for instances that failed to start.
+    :return: Generator of instance dicts (InstanceId, PublicIpAddress, PrivateIpAddress, ...).
+    """
+    pending = list(dict.fromkeys(instance_ids))
+    deadline = time.monotonic() + timeout
+    interval = min_interval
+    while pending:
+        ready = []
+        gone = set()
+        for start in range(0, len(pending), DESCRIBE_CHUNK):
+            chunk = pending[start:start + DESCRIBE_CHUNK]
+            try:
+                response = ec2_client.describe_instances(InstanceIds=chunk)
+            except ClientError as e:
+                # Freshly launched IDs can briefly be unknown to describe calls
+                print(f"Instances not visible yet: {e}")
+                continue
+            for reservation in response['Reservations']:
+                for instance in reservation['Instances']:
+                    state_name = instance['State']['Name']
+                    if state_name == 'running':
+                        ready.append(instance)
+                    elif state_name in FAILED_STATES:
+                        reason = instance.get('StateReason', {}).get('Message') or state_name
+                        print(f"Instance {instance['InstanceId']} failed to start: {reason}")
+                        gone.add(instance['InstanceId'])
+                        if failed is not None:
+                            failed[instance['InstanceId']] = reason
+        for instance in ready:
+            yield instance
+        done = gone | {instance['InstanceId'] for instance in ready}
+        pending = [instance_id for instance_id in pending if instance_id not in done]
+        if not pending:
+            break
+        if time.monotonic() >= deadline:
+            print(f"Timed out waiting for instances to become running: {', '.join(pending)}")
+            break
+        interval = min_interval if ready else min(max_interval, interval * 1.5)
+        time.sleep(min(interval, max(0, deadline - time.monotonic())))
+
+
+def wait_for_instances_running(ec2_client, instance_ids, timeout=600):
+    """
+    Wait for several EC2 instances to enter the 'running' state.
+    :return: Dict of instance ID -> instance description for the ones that are running.
+    """
+    return {instance['InstanceId']: instance for instance in iter_running_instances(ec2_client, instance_ids, timeout)}
+
+
 def wait_for_instance_running(ec2_client, instance_id, timeout=300):
         """
         Wait for the specified EC2 instance to enter the 'running' state.
@@ -80,18 +243,7 @@ def wait_for_instance_running(ec2_client, instance_id, timeout=300):
         :param timeout: Maximum time to wait (in seconds).
         """
         print(f"Waiting for instance {instance_id} to become running...")
-        elapsed_time = 0
-        while elapsed_time < timeout:
-            try:
-                response = ec2_client.describe_instance_status(InstanceIds=[instance_id])
-                state = response['InstanceStatuses'][0]['InstanceState']['Name']
-                if state == 'running':
-                    print(f"Instance {instance_id} is running.")
-                    return True
-            except IndexError:
-                # In case the instance status is not available yet, continue polling
-                pass
-            time.sleep(10)
-            elapsed_time += 10
-        print(f"Timed out waiting for instance {instance_id} to become running.")
-        return False
+        if wait_for_instances_running(ec2_client, [instance_id], timeout):
+            print(f"Instance {instance_id} is running.")
+            return True
+        return False
@@ -0,0 +1,99 @@
+import logging
+import threading
+import digitalocean
+
+
+class TagBatcher:
+    """Collects droplet tag changes for a whole run and applies them per tag.
+
+    Deploy workers call ``add()`` / ``remove()`` while reconciling droplets;
+    ``flush()`` then creates each tag at most once and issues one
+    ``add_droplets`` / ``remove_droplets`` call per tag carrying every droplet
+    ID, so retagging a fleet costs a few calls per tag instead of one per
+    droplet. Tags marked with ``delete_if_unused()`` are deleted afterwards
+    if nothing is tagged with them any more. Failed changes are returned to
+    the caller rather than only logged.
+    """
+
+    def __init__(self, token):
+        self.token = token
+        self._adds = {}
+        self._removes = {}
+        self._delete_unused = set()
+        self._lock = threading.Lock()
+
+    def add(self, tag, droplet_id):
+        with self._lock:
+            self._adds.setdefault(tag, set()).add(droplet_id)
+            self._removes.get(tag, set()).discard(droplet_id)
+
+    def remove(self, tag, droplet_id):
+        with self._lock:
+            self._removes.setdefault(tag, set()).add(droplet_id)
+            self._adds.get(tag, set()).discard(droplet_id)
+
+    def delete_if_unused(self, tag):
+        with self._lock:
+            self._delete_unused.add(tag)
+
+    def pending(self):
+        with self._lock:
+            return sum(len(ids) for ids in self._adds.values()) + sum(len(ids) for ids in self._removes.values())
+
+    def flush(self):
+        """Apply all collected changes.
+
+        :return: Dict with calls (API calls made), applied and failed (tag
+            changes, one per tag and direction) and failures, a list of
+            ``(action, tag, droplet_ids)`` with action ``'add'`` or ``'remove'``.
+        """
+        log = logging.getLogger(__name__)
+        with self._lock:
+            adds, self._adds = self._adds, {}
+            removes, self._removes = self._removes, {}
+            delete_unused, self._delete_unused = self._delete_unused, set()
+
+        calls = 0
+        applied = 0
+        failures = []
+        for tag, droplet_ids in sorted(adds.items()):
+            if not droplet_ids:
+                continue
+            tag_obj = digitalocean.Tag(token=self.token, name=tag)
+            try:
+                calls += 1
+                tag_obj.create()
+                calls += 1
+                tag_obj.add_droplets(sorted(droplet_ids))
+                applied += 1
+                log.info(f"Tagged {len(droplet_ids)} droplet(s) with '{tag}'")
+            except Exception as e:
+                failures.append(('add', tag, sorted(droplet_ids)))
+                log.warning(f"Unable to add tag '{tag}' to droplets {sorted(droplet_ids)}: {e}")
+
+        for tag, droplet_ids in sorted(removes.items()):
+            if not droplet_ids:
+                continue
+            try:
+                calls += 1
+                digitalocean.Tag(token=self.token, name=tag).remove_droplets(sorted(droplet_ids))
+                applied += 1
+                log.info(f"Removed tag '{tag}' from {len(droplet_ids)} droplet(s)")
+            except Exception as e:
+                failures.append(('remove', tag, sorted(droplet_ids)))
+                log.warning(f"Unable to remove tag '{tag}' from droplets {sorted(droplet_ids)}: {e}")
+
+        for tag in sorted(delete_unused):
+            tag_obj = digitalocean.Tag(token=self.token, name=tag)
+            try:
+                tag_obj.load()
+                calls += 1
+                if (tag_obj.resources or {}).get('count', 0):
+                    log.debug(f"Keeping tag {tag}: still in use")
+                    continue
+                tag_obj.delete()
+                calls += 1
+                log.info(f"Deleted unused tag: {tag}")
+            except Exception as e:
+                log.debug(f"Skipping deletion of tag {tag}: {e}")
+        return {'calls': calls, 'applied': applied, 'failed': len(failures), 'failures': failures}
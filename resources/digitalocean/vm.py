@@ -1,9 +1,93 @@
 import logging
+import threading
 import digitalocean
 import time
 
+
+class DropletPoller:
+    """Shared readiness poller for droplets being provisioned.
+
+    Callers register a freshly created droplet with ``wait()`` and block. A
+    single background loop issues one list call per cycle for all pending
+    droplets (filtered by tag when they share one) and wakes each waiter once
+    its droplet is active and has an IP. The interval starts at
+    ``min_interval`` and backs off towards ``max_interval`` while nothing
+    becomes ready. Each waiter gives up after its own deadline.
+    """
+
+    def __init__(self, do_manager, min_interval=2.0, max_interval=15.0, timeout=600):
+        self.token = do_manager.token
+        self.manager = digitalocean.Manager(token=self.token)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wait(self, droplet, timeout=None):
+        """Block until the droplet is active with an IP; returns the refreshed droplet, or None on timeout."""
+        entry = {
+            'droplet': droplet,
+            'event': threading.Event(),
+            'deadline': time.monotonic() + (timeout or self.timeout),
+            'ready': False,
+        }
+        with self._lock:
+            self._pending[droplet.id] = entry
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='droplet-poller', daemon=True)
+                self._thread.start()
+        entry['event'].wait()
+        return entry['droplet'] if entry['ready'] else None
+
+    def _run(self):
+        interval = self.min_interval
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                pending = dict(self._pending)
+            try:
+                found = self._poll(pending)
+            except Exception as e:
+                logging.getLogger(__name__).debug(f"Droplet readiness poll failed: {e}")
+                found = {}
+            progressed = False
+            now = time.monotonic()
+            with self._lock:
+                for droplet_id, entry in pending.items():
+                    droplet = found.get(droplet_id)
+                    if droplet is not None and getattr(droplet, 'status', None) == 'active' and droplet.ip_address:
+                        entry['droplet'] = droplet
+                        entry['ready'] = True
+                    elif now < entry['deadline']:
+                        continue
+                    else:
+                        logging.getLogger(__name__).warning(f"Timed out waiting for droplet {droplet_id} to become active")
+                    del self._pending[droplet_id]
+                    entry['event'].set()
+                    progressed = progressed or entry['ready']
+                if not self._pending:
+                    self._thread = None
+                    return
+            interval = self.min_interval if progressed else min(self.max_interval, interval * 1.5)
+
+    def _poll(self, pending):
+        """Return {droplet_id: droplet} for the pending droplets using as few API calls as possible."""
+        droplets = [entry['droplet'] for entry in pending.values()]
+        if len(droplets) == 1:
+            droplet = droplets[0]
+            droplet.load()
+            return {droplet.id: droplet}
+        shared_tags = set.intersection(*(set(getattr(d, 'tags', None) or []) for d in droplets))
+        listed = self.manager.get_all_droplets(tag_name=sorted(shared_tags)[0] if shared_tags else None)
+        return {d.id: d for d in listed if d.id in pending}
+
 class VM:
-    def __init__(self, name, region, size_slug, image, ssh_keys, user_data=None):
+    # The API accepts at most this many names per multi-create request.
+    MAX_PER_REQUEST = 10
+
+    def __init__(self, name, region, size_slug, image, ssh_keys, user_data=None, tags=None):
         """
         Initialize VM resource with necessary parameters.
         :param name: A unique name or identifier for the VM.
@@ -12,6 +96,7 @@ class VM:
         :param image: The image ID or slug (e.g., 'ubuntu-20-04-x64').
         :param ssh_keys: List of SSH key IDs to inject into the VM.
         :param user_data: Script or other user data to execute on instance launch.
+        :param tags: List of tag names to apply at creation.
         """
         self.name = name
         self.region = region
@@ -19,6 +104,7 @@ class VM:
         self.image = image
         self.ssh_keys = ssh_keys
         self.user_data = user_data
+        self.tags = tags or []
 
     def create(self, do_manager):
         """Create a new Droplet using the provided DigitalOcean manager."""
@@ -31,21 +117,60 @@ class VM:
                 size_slug=self.size_slug,
                 ssh_keys=self.ssh_keys,
                 user_data=self.user_data,
+                tags=self.tags,
                 backups=False
             )
             droplet.create()
             logging.getLogger(__name__).info(f"Droplet '{self.name}' creation request sent.")
 
             # Wait for the droplet to become active and get the IP address
-            droplet.load()
-            while not droplet.ip_address:
-                time.sleep(5)
-                droplet.load()
-            return droplet
+            return self.wait_ready(do_manager, droplet)
         except Exception as e:
             logging.getLogger(__name__).error(f"Failed to create Droplet '{self.name}': {e}")
             return None
 
+    @classmethod
+    def request_multiple(cls, do_manager, names, region, size_slug, image, ssh_keys, user_data=None, tags=None):
+        """Send multi-create requests (one per MAX_PER_REQUEST names) without waiting.
+
+        Returns the new droplets, which are not active yet; names whose request
+        failed are missing.
+        """
+        log = logging.getLogger(__name__)
+        created = []
+        for start in range(0, len(names), cls.MAX_PER_REQUEST):
+            chunk = names[start:start + cls.MAX_PER_REQUEST]
+            try:
+                created.extend(digitalocean.Droplet.create_multiple(
+                    token=do_manager.token,
+                    names=chunk,
+                    region=region,
+                    image=image,
+                    size_slug=size_slug,
+                    ssh_keys=ssh_keys,
+                    user_data=user_data,
+                    tags=tags or [],
+                    backups=False
+                ))
+                log.info(f"Creation request sent for {len(chunk)} droplets: {', '.join(chunk)}")
+            except Exception as e:
+                log.error(f"Failed to create droplets {', '.join(chunk)}: {e}")
+        return created
+
+    @staticmethod
+    def wait_ready(do_manager, droplet):
+        """Wait through the shared poller until the droplet is active with an IP.
+
+        Returns the refreshed droplet, or the droplet as created if it is not
+        active before the poller's timeout.
+        """
+        poller = getattr(do_manager, 'droplet_poller', None) or DropletPoller(do_manager)
+        ready = poller.wait(droplet)
+        if ready is None:
+            logging.getLogger(__name__).warning(f"Droplet '{droplet.name}' ({droplet.id}) is not active yet; recording it without an IP.")
+            return droplet
+        return ready
+
     @staticmethod
     def delete(do_manager, droplet_id):
         """Delete the specified Droplet using only the droplet ID."""
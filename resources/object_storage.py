@@ -0,0 +1,268 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config_loader import resolve_parallelism
+
+logger = logging.getLogger(__name__)
+
+# delete_objects accepts at most this many keys per request.
+DELETE_BATCH = 1000
+
+# Files at or above this size are uploaded in parts of this size (boto3's defaults).
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+# S3-compatible clients shared across all bucket resources in a run, keyed by (endpoint, region, credentials)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def s3_client(endpoint, region, access_key, secret_key, max_pool_connections=50, max_attempts=10):
+    """Return a cached S3 client for an S3-compatible endpoint (Spaces, Vultr Object Storage, ...).
+
+    Building a client loads the botocore service model and every client
+    keeps its own connection pool, so each distinct endpoint/credential pair
+    gets one client per process. The pool is sized for parallel uploads and
+    deletes, and adaptive retries absorb throttling.
+    """
+    key = (endpoint, region, access_key, secret_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            import boto3
+            from botocore.config import Config
+            logger.debug(f"Creating S3 client for {endpoint} ({region})")
+            # boto3 sessions are not thread-safe, so creation stays under the lock
+            client = boto3.session.Session().client(
+                's3', region_name=region, endpoint_url=endpoint,
+                aws_access_key_id=access_key, aws_secret_access_key=secret_key,
+                config=Config(max_pool_connections=max_pool_connections,
+                              retries={'mode': 'adaptive', 'max_attempts': max_attempts}),
+            )
+            _clients[key] = client
+        return client
+
+
+def _iter_objects(s3, bucket):
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket):
+        for obj in page.get('Contents', []):
+            yield {'Key': obj['Key']}
+
+
+def _iter_versions(s3, bucket):
+    for page in s3.get_paginator('list_object_versions').paginate(Bucket=bucket):
+        for version in page.get('Versions', []) + page.get('DeleteMarkers', []):
+            yield {'Key': version['Key'], 'VersionId': version['VersionId']}
+
+
+def empty_bucket(s3, bucket, versions=True, parallelism=None, max_retries=5):
+    """Delete every object in an S3-compatible bucket.
+
+    With ``versions`` (needed for versioned buckets) the bucket is listed
+    with ``list_object_versions`` and every version and delete marker is
+    removed; otherwise current objects are listed and deleted.
+
+    The listing runs as a producer on the calling thread and hands full
+    1000-key ``delete_objects`` batches to a thread pool; at most two batches
+    per worker are in flight so memory stays flat for huge buckets. Keys that
+    come back in a response's ``Errors`` are retried with backoff, up to
+    ``max_retries`` times.
+
+    :return: Dict with deleted, failed, seconds and keys_per_sec.
+    """
+    workers = resolve_parallelism(parallelism)
+    in_flight = threading.Semaphore(workers * 2)
+    lock = threading.Lock()
+    stats = {'deleted': 0, 'failed': 0}
+    started = time.monotonic()
+
+    def _delete(batch):
+        try:
+            for attempt in range(max_retries + 1):
+                try:
+                    response = s3.delete_objects(Bucket=bucket, Delete={'Objects': batch, 'Quiet': True})
+                    errors = response.get('Errors', [])
+                except Exception as e:
+                    logger.debug(f"delete_objects on {bucket} failed (attempt {attempt + 1}): {e}")
+                    errors = [{'Key': obj['Key'], 'VersionId': obj.get('VersionId'), 'Code': str(e)} for obj in batch]
+                failed = {(err.get('Key'), err.get('VersionId')) for err in errors}
+                with lock:
+                    stats['deleted'] += len(batch) - len(failed)
+                batch = [obj for obj in batch if (obj['Key'], obj.get('VersionId')) in failed]
+                if not batch:
+                    return
+                if attempt < max_retries:
+                    time.sleep(random.uniform(0, min(30.0, 0.5 * 2 ** attempt)))
+            logger.warning(f"Giving up on {len(batch)} key(s) in {bucket}, e.g. {batch[0]['Key']}: {errors[0].get('Code')}")
+            with lock:
+                stats['failed'] += len(batch)
+        finally:
+            in_flight.release()
+
+    # Deleting by version removes the data outright; a plain delete in a versioned bucket would only add markers
+    listing = _iter_versions if versions else _iter_objects
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        batch = []
+        for obj in listing(s3, bucket):
+            batch.append(obj)
+            if len(batch) == DELETE_BATCH:
+                in_flight.acquire()
+                pool.submit(_delete, batch)
+                batch = []
+        if batch:
+            in_flight.acquire()
+            pool.submit(_delete, batch)
+
+    seconds = time.monotonic() - started
+    stats['seconds'] = round(seconds, 2)
+    stats['keys_per_sec'] = round(stats['deleted'] / seconds, 1) if seconds > 0 else float(stats['deleted'])
+    logger.info(f"Emptied {bucket}: {stats['deleted']} key(s) deleted, {stats['failed']} failed, "
+                f"{stats['keys_per_sec']} keys/sec")
+    return stats
+
+
+def sync_options(value):
+    """Normalize a resource's ``sync`` property: a path string or a dict with source/prefix/delete/acl.
+
+    Raises ValueError when the source is missing or is not a directory, so
+    callers can reject the resource before creating its bucket.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = {'source': value}
+    source = value.get('source') or value.get('path')
+    if not source:
+        raise ValueError("sync needs a 'source' directory")
+    source = os.path.expanduser(source)
+    if not os.path.isdir(source):
+        raise ValueError(f"sync source '{source}' is not a directory")
+    prefix = str(value.get('prefix') or '').lstrip('/')
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+    return {
+        'source': source,
+        'prefix': prefix,
+        'delete': bool(value.get('delete', False)),
+        'acl': value.get('acl'),
+    }
+
+
+def _iter_local_files(source, prefix):
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            rel = os.path.relpath(path, source).replace(os.sep, '/')
+            yield prefix + rel, path
+
+
+def _list_remote(s3, bucket, prefix):
+    remote = {}
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            remote[obj['Key']] = (obj.get('ETag', '').strip('"'), obj.get('Size'))
+    return remote
+
+
+def local_etag(path, threshold=MULTIPART_THRESHOLD, chunksize=MULTIPART_CHUNKSIZE):
+    """Return the ETag S3 reports for ``path`` once uploaded with these multipart settings.
+
+    Single-part uploads get the MD5 of the content; multipart uploads get the
+    MD5 of the concatenated part MD5s followed by ``-<parts>``.
+    """
+    size = os.path.getsize(path)
+    if size < threshold:
+        digest = hashlib.md5()
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    from s3transfer.utils import ChunksizeAdjuster
+    # boto3 grows the part size for very large files, so mirror that to get the same part boundaries
+    chunksize = ChunksizeAdjuster().adjust_chunksize(chunksize, size)
+    part_digests = []
+    with open(path, 'rb') as fh:
+        for part in iter(lambda: fh.read(chunksize), b''):
+            part_digests.append(hashlib.md5(part).digest())
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def sync_directory(s3, bucket, source, prefix='', delete=False, acl=None, parallelism=None,
+                   multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_CHUNKSIZE):
+    """Upload a local directory to an S3-compatible bucket.
+
+    Objects whose size and ETag already match the local file are skipped, the
+    rest are uploaded from a thread pool, with files above
+    ``multipart_threshold`` sent as concurrent multipart uploads. With
+    ``delete`` set, remote objects under ``prefix`` that have no local
+    counterpart are removed.
+
+    :return: Dict with uploaded, skipped, deleted, failed, bytes and seconds.
+    """
+    from boto3.s3.transfer import TransferConfig
+
+    if not os.path.isdir(source):
+        raise ValueError(f"sync source '{source}' is not a directory")
+
+    workers = resolve_parallelism(parallelism)
+    transfer = TransferConfig(multipart_threshold=multipart_threshold,
+                              multipart_chunksize=multipart_chunksize,
+                              max_concurrency=4)
+    lock = threading.Lock()
+    stats = {'uploaded': 0, 'skipped': 0, 'deleted': 0, 'failed': 0, 'bytes': 0}
+    started = time.monotonic()
+
+    remote = _list_remote(s3, bucket, prefix)
+    local = dict(_iter_local_files(source, prefix))
+
+    def _sync(item):
+        key, path = item
+        try:
+            size = os.path.getsize(path)
+            current = remote.get(key)
+            if current and current[1] == size \
+                    and current[0] == local_etag(path, multipart_threshold, multipart_chunksize):
+                with lock:
+                    stats['skipped'] += 1
+                return
+            extra = {'ContentType': mimetypes.guess_type(path)[0] or 'application/octet-stream'}
+            if acl:
+                extra['ACL'] = acl
+            s3.upload_file(path, bucket, key, ExtraArgs=extra, Config=transfer)
+            logger.debug(f"Uploaded {path} to {bucket}/{key}")
+            with lock:
+                stats['uploaded'] += 1
+                stats['bytes'] += size
+        except Exception as e:
+            logger.error(f"Failed to upload {path} to {bucket}/{key}: {e}")
+            with lock:
+                stats['failed'] += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_sync, local.items()))
+
+    if delete:
+        extras = [{'Key': key} for key in sorted(remote) if key not in local]
+        for i in range(0, len(extras), DELETE_BATCH):
+            batch = extras[i:i + DELETE_BATCH]
+            try:
+                response = s3.delete_objects(Bucket=bucket, Delete={'Objects': batch, 'Quiet': True})
+                errors = response.get('Errors', [])
+            except Exception as e:
+                logger.error(f"Failed to delete extra objects from {bucket}: {e}")
+                errors = batch
+            stats['deleted'] += len(batch) - len(errors)
+            stats['failed'] += len(errors)
+
+    stats['seconds'] = round(time.monotonic() - started, 2)
+    logger.info(f"Synced {source} to {bucket}/{prefix}: {stats['uploaded']} uploaded, {stats['skipped']} unchanged, "
+                f"{stats['deleted']} deleted, {stats['failed']} failed")
+    return stats
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+
+# Property values whose canonical JSON is at least this many bytes are stored as blobs.
+BLOB_THRESHOLD = 1024
+
+BLOB_REF_KEY = '$blob'
+
+
+def canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def digest(value):
+    """Return the content address (sha256 of canonical JSON) of a value."""
+    return 'sha256:' + hashlib.sha256(canonical_json(value).encode()).hexdigest()
+
+
+def is_blob_ref(value):
+    return isinstance(value, dict) and len(value) == 1 and BLOB_REF_KEY in value
+
+
+class BlobStore:
+    """Content-addressed side store for large state property values.
+
+    Values such as full ``user_data`` scripts, Spaces lifecycle documents and
+    long firewall rule lists are written once under their hash and replaced in
+    state by ``{"$blob": "sha256:..."}``. Fleets sharing the same cloud-init
+    therefore store it once, and diffs can compare hashes without reading the
+    blob back.
+    """
+
+    def __init__(self, root, threshold=BLOB_THRESHOLD, inline_keys=()):
+        self.root = root
+        self.threshold = threshold
+        # Keys that always stay in state, e.g. references other resources are resolved through
+        self.inline_keys = frozenset(inline_keys)
+        self._known = set()
+        self._cache = {}
+
+    @classmethod
+    def for_state_file(cls, file_path, **kwargs):
+        return cls(os.path.join(os.path.dirname(os.path.abspath(file_path)), '.pyraform', 'blobs'), **kwargs)
+
+    def put(self, value):
+        """Store a value and return its reference."""
+        data = canonical_json(value)
+        ref = 'sha256:' + hashlib.sha256(data.encode()).hexdigest()
+        if ref not in self._known:
+            path = self._path(ref)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+                with open(tmp_path, 'w') as file:
+                    file.write(data)
+                os.replace(tmp_path, path)
+            self._known.add(ref)
+            self._cache[ref] = value
+        return {BLOB_REF_KEY: ref}
+
+    def get(self, ref):
+        """Return the value behind a reference (or a bare digest)."""
+        ref = ref[BLOB_REF_KEY] if is_blob_ref(ref) else ref
+        if ref not in self._cache:
+            with open(self._path(ref), 'r') as file:
+                self._cache[ref] = json.load(file)
+            self._known.add(ref)
+        return self._cache[ref]
+
+    def resolve(self, value):
+        """Return the stored value for a reference; other values pass through."""
+        return self.get(value) if is_blob_ref(value) else value
+
+    def matches(self, stored, value):
+        """Compare a state value (possibly a reference) with a desired value without loading blobs."""
+        if is_blob_ref(stored):
+            return stored[BLOB_REF_KEY] == digest(value)
+        return stored == value
+
+    def externalize(self, properties):
+        """Return a copy of ``properties`` with large values replaced by references."""
+        if not isinstance(properties, dict):
+            return properties
+        out = {}
+        for key, value in properties.items():
+            if key not in self.inline_keys and isinstance(value, (str, list, dict)) and not is_blob_ref(value) \
+                    and len(canonical_json(value)) >= self.threshold:
+                out[key] = self.put(value)
+            else:
+                out[key] = value
+        return out
+
+    def _path(self, ref):
+        hexdigest = ref.split(':', 1)[1]
+        return os.path.join(self.root, hexdigest[:2], hexdigest)
@@ -1,18 +1,492 @@
-import json
-import os
-
-def load_state(file_path='state.json'):
-    """Loads the current state from a JSON file."""
-    if not os.path.exists(file_path):
-        return {"resources": []}
-    with open(file_path, 'r') as file:
-        return json.load(file)
-
-def save_state(state, file_path='state.json'):
-    """Saves the state to a JSON file."""
-    with open(file_path, 'w') as file:
-        json.dump(state, file, indent=4)
-
+import json
+import logging
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+
+from state.blob_store import BlobStore
+
+# Property keys holding provider-assigned identifiers; indexed for reverse lookups.
+ID_KEYS = (
+    'droplet_id', 'instance_id', 'volume_id', 'block_id', 'disk_id',
+    'firewall_id', 'group_id', 'load_balancer_id', 'vpc_id', 'record_id',
+    'cluster_id', 'database_id', 'snapshot_id', 'script_id', 'key_id',
+    'route_id', 'peering_id', 'hosted_zone_id',
+)
+
+# Properties whose values name other resources in the same configuration.
+REFERENCE_KEYS = (
+    'attach_to', 'droplets', 'assign_to', 'instances', 'vpc', 'vpc_a', 'vpc_b',
+    'startup_script', 'firewall', 'instance', 'domain',
+)
+
+# References recorded in state: name-valued keys, plus ID-valued keys mapped to the ID they point at.
+STATE_REFERENCE_KEYS = REFERENCE_KEYS + ('assigned_to',)
+STATE_ID_REFERENCES = {
+    'attached_to': 'droplet_id',
+    'droplet_ids': 'droplet_id',
+    'attached_to_vm': 'instance_id',
+}
+
+# Never moved into the blob store, however large: dependency walks and ID lookups read them directly.
+INLINE_KEYS = frozenset(ID_KEYS + STATE_REFERENCE_KEYS + tuple(STATE_ID_REFERENCES))
+
+# Journal entries between automatic compactions of the state snapshot.
+COMPACT_EVERY = 500
+
+DEFAULT_STATE_FILES = {'json': 'state.json', 'sqlite': 'state.db'}
+
+
+def _type_key(resource_type):
+    return str(resource_type or '').lower()
+
+
+class State:
+    """In-memory view of state.json with hash indexes.
+
+    Resources are indexed by (name, type), by provider ID (see ``ID_KEYS``),
+    by type and by name so handlers never scan the full resource list.
+    Types are matched case-insensitively. Insertion order is preserved.
+    Large property values are held as references into ``blobs``.
+    """
+
+    def __init__(self, data=None, file_path='state.json', backend=None):
+        data = data or {}
+        self.file_path = file_path
+        self.backend = backend or JsonStateBackend(file_path)
+        self.blobs = BlobStore.for_state_file(file_path, inline_keys=INLINE_KEYS)
+        # Serialises updates when resources are applied from worker threads.
+        self.lock = threading.RLock()
+        self.extra = {k: v for k, v in data.items() if k != 'resources'}
+        self._by_key = {}
+        self._by_id = {}
+        self._by_type = {}
+        self._by_name = {}
+        for resource in data.get('resources', []) or []:
+            self.upsert(resource)
+
+    @property
+    def resources(self):
+        """Snapshot list of all resources, in insertion order."""
+        return list(self._by_key.values())
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def find(self, name, resource_type):
+        """Return the resource for (name, type), or None."""
+        return self._by_key.get((name, _type_key(resource_type)))
+
+    def id_of(self, name, resource_type, id_key):
+        """Return properties[id_key] of (name, type), or None."""
+        resource = self.find(name, resource_type)
+        if not resource:
+            return None
+        return (resource.get('properties') or {}).get(id_key)
+
+    def find_by_id(self, id_key, value):
+        """Return the resource whose properties[id_key] equals value, or None."""
+        if value is None:
+            return None
+        return self._by_id.get((id_key, str(value)))
+
+    def of_type(self, resource_type):
+        """Return all resources of a type, in insertion order."""
+        return list(self._by_type.get(_type_key(resource_type), {}).values())
+
+    def named(self, name):
+        """Return all resources with the given name, regardless of type."""
+        return list(self._by_name.get(name, {}).values())
+
+    def upsert(self, resource):
+        key = (resource.get('name'), _type_key(resource.get('type')))
+        previous = self._by_key.get(key)
+        if previous is not None:
+            self._unindex_ids(previous)
+        self._by_key[key] = resource
+        self._by_type.setdefault(key[1], {})[key] = resource
+        self._by_name.setdefault(key[0], {})[key] = resource
+        self._index_ids(resource)
+
+    def update_properties(self, resource):
+        existing = self.find(resource.get('name'), resource.get('type'))
+        if existing is None:
+            return
+        self._unindex_ids(existing)
+        existing['properties'] = resource.get('properties')
+        self._index_ids(existing)
+
+    def remove(self, resource):
+        key = (resource.get('name'), _type_key(resource.get('type')))
+        previous = self._by_key.pop(key, None)
+        if previous is None:
+            return
+        self._by_type.get(key[1], {}).pop(key, None)
+        self._by_name.get(key[0], {}).pop(key, None)
+        self._unindex_ids(previous)
+
+    def to_dict(self):
+        return {**self.extra, 'resources': self.resources}
+
+    def _index_ids(self, resource):
+        props = resource.get('properties') or {}
+        for id_key in ID_KEYS:
+            if props.get(id_key) is not None:
+                self._by_id[(id_key, str(props[id_key]))] = resource
+
+    def _unindex_ids(self, resource):
+        props = resource.get('properties') or {}
+        for id_key in ID_KEYS:
+            if props.get(id_key) is not None:
+                ref = (id_key, str(props[id_key]))
+                if self._by_id.get(ref) is resource:
+                    del self._by_id[ref]
+
+
+class JsonStateBackend:
+    """state.json snapshot plus an append-only journal of per-resource changes.
+
+    Every change is appended to ``<file>.journal`` and fsync'd, which is cheap
+    compared to rewriting the whole snapshot. The journal is compacted into
+    the snapshot (write to a temp file, then atomic rename) every
+    ``compact_every`` changes and at the end of a run. Loading replays any
+    journal tail left behind by an interrupted run.
+    """
+
+    def __init__(self, file_path='state.json', compact_every=COMPACT_EVERY):
+        self.file_path = file_path
+        self.journal_path = f"{file_path}.journal"
+        self.compact_every = compact_every
+        self._journal = None
+        self._pending = 0
+
+    def load(self, types=None):
+        # The snapshot has to be parsed whole, so a type filter buys nothing here.
+        data = {"resources": []}
+        if os.path.exists(self.file_path):
+            with open(self.file_path, 'r') as file:
+                data = json.load(file)
+        state = State(data, self.file_path, backend=self)
+        replayed = self._replay(state)
+        if replayed:
+            logging.getLogger(__name__).info(f"Replayed {replayed} journaled state change(s) from {self.journal_path}")
+            self.compact(state)
+        return state
+
+    def record(self, state, resource, action):
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a')
+        self._journal.write(json.dumps({"action": action, "resource": resource}, separators=(',', ':')) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._pending += 1
+        if self._pending >= self.compact_every:
+            self.compact(state)
+
+    def compact(self, state):
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(state.to_dict(), file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.file_path)
+        _fsync_dir(self.file_path)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._pending = 0
+
+    def _replay(self, state):
+        if not os.path.exists(self.journal_path):
+            return 0
+        replayed = 0
+        with open(self.journal_path, 'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash mid-append leaves a truncated last line; everything before it is intact.
+                    logging.getLogger(__name__).warning(f"Ignoring truncated entry in {self.journal_path}")
+                    break
+                _apply(state, entry['resource'], entry['action'])
+                replayed += 1
+        return replayed
+
+
+class SqliteStateBackend:
+    """SQLite state store for large stacks.
+
+    Each resource is one row indexed by (name, type), type and provider ID,
+    with properties kept as a JSON column. Upserts and deletes are single-row
+    writes, and ``load(types=...)`` reads only the rows a caller needs.
+    """
+
+    def __init__(self, file_path='state.db', read_only=False):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        if read_only:
+            # mode=ro fails on a missing file instead of creating an empty database
+            self._conn = sqlite3.connect(f"file:{quote(os.path.abspath(file_path))}?mode=ro", uri=True,
+                                         check_same_thread=False)
+            return
+        self._conn = sqlite3.connect(file_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS resources (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                type TEXT NOT NULL,
+                type_key TEXT NOT NULL,
+                provider_id_key TEXT,
+                provider_id TEXT,
+                properties TEXT,
+                extra TEXT,
+                UNIQUE (name, type_key)
+            );
+            CREATE INDEX IF NOT EXISTS resources_type ON resources (type_key);
+            CREATE INDEX IF NOT EXISTS resources_provider_id ON resources (provider_id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._conn.commit()
+
+    def load(self, types=None):
+        """Load state; ``types`` limits rows to matching (optionally provider-prefixed) types."""
+        query = "SELECT name, type, properties, extra FROM resources"
+        params = []
+        if types:
+            clauses = []
+            for t in sorted({_type_key(t) for t in types}):
+                clauses.append("type_key = ? OR type_key LIKE ? ESCAPE '\\'")
+                params += [t, '%\\_' + t.replace('_', '\\_')]
+            query += " WHERE " + " OR ".join(clauses)
+        query += " ORDER BY seq"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        data = {key: json.loads(value) for key, value in meta.items()}
+        data['resources'] = [self._from_row(*row) for row in rows]
+        return State(data, self.file_path, backend=self)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, state, resource, action):
+        with self._lock:
+            if action == "create":
+                self._conn.execute(
+                    "INSERT INTO resources (name, type, type_key, provider_id_key, provider_id, properties, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (name, type_key) DO UPDATE SET type = excluded.type, "
+                    "provider_id_key = excluded.provider_id_key, provider_id = excluded.provider_id, "
+                    "properties = excluded.properties, extra = excluded.extra",
+                    self._to_row(resource))
+            elif action == "update":
+                existing = state.find(resource.get('name'), resource.get('type'))
+                if existing is not None:
+                    row = self._to_row(existing)
+                    self._conn.execute(
+                        "UPDATE resources SET provider_id_key = ?, provider_id = ?, properties = ? "
+                        "WHERE name = ? AND type_key = ?",
+                        (row[3], row[4], row[5], row[0], row[2]))
+            elif action == "delete":
+                self._conn.execute("DELETE FROM resources WHERE name = ? AND type_key = ?",
+                                   (resource.get('name'), _type_key(resource.get('type'))))
+            self._conn.commit()
+
+    def compact(self, state):
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                   [(k, json.dumps(v)) for k, v in state.extra.items()])
+            self._conn.commit()
+
+    def replace_all(self, state):
+        """Overwrite every row with the contents of ``state`` in one transaction."""
+        with self._lock:
+            self._conn.execute("DELETE FROM resources")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.executemany(
+                "INSERT INTO resources (name, type, type_key, provider_id_key, provider_id, properties, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [self._to_row(r) for r in state.resources])
+            self._conn.commit()
+        self.compact(state)
+
+    @staticmethod
+    def _to_row(resource):
+        props = resource.get('properties') or {}
+        id_key = next((k for k in ID_KEYS if props.get(k) is not None), None)
+        extra = {k: v for k, v in resource.items() if k not in ('name', 'type', 'properties')}
+        return (
+            resource.get('name'),
+            resource.get('type'),
+            _type_key(resource.get('type')),
+            id_key,
+            str(props[id_key]) if id_key else None,
+            json.dumps(resource.get('properties')),
+            json.dumps(extra) if extra else None,
+        )
+
+    @staticmethod
+    def _from_row(name, resource_type, properties, extra):
+        resource = {'type': resource_type, 'name': name, 'properties': json.loads(properties) if properties else {}}
+        if extra:
+            resource.update(json.loads(extra))
+        return resource
+
+
+def _fsync_dir(file_path):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _apply(state, resource, action):
+    if action == "create":
+        state.upsert(resource)
+    elif action == "update":
+        state.update_properties(resource)
+    elif action == "delete":
+        state.remove(resource)
+
+
+def _user_settings():
+    try:
+        from config_loader import load_user_settings
+        return load_user_settings() or {}
+    except Exception:
+        return {}
+
+
+def configured_backend(settings=None):
+    """Return the backend name from PYRAFORM_STATE_BACKEND or settings.yml (default json)."""
+    settings = _user_settings() if settings is None else settings
+    return (os.getenv('PYRAFORM_STATE_BACKEND') or settings.get('state_backend') or 'json').lower()
+
+
+def state_paths(settings=None):
+    """Return {'json': path, 'sqlite': path} for the configured state location.
+
+    ``state_file`` names the file of the configured backend; the other
+    backend's file sits next to it with the same stem (``prod.json`` <->
+    ``prod.db``). Without ``state_file`` these are state.json and state.db.
+    """
+    settings = _user_settings() if settings is None else settings
+    backend = configured_backend(settings)
+    state_file = settings.get('state_file')
+    if not state_file:
+        return dict(DEFAULT_STATE_FILES)
+    stem = os.path.splitext(state_file)[0]
+    return {
+        name: state_file if name == backend else stem + os.path.splitext(default)[1]
+        for name, default in DEFAULT_STATE_FILES.items()
+    }
+
+
+def get_backend(name=None, file_path=None):
+    """Return the state backend selected by name, PYRAFORM_STATE_BACKEND or settings.yml.
+
+    Settings keys: ``state_backend`` (``json`` or ``sqlite``) and optional ``state_file``.
+    """
+    settings = _user_settings() if not name or not file_path else {}
+    name = (name or configured_backend(settings)).lower()
+    if name not in DEFAULT_STATE_FILES:
+        raise ValueError(f"Unsupported state backend: {name}")
+    file_path = file_path or settings.get('state_file') or DEFAULT_STATE_FILES[name]
+    if name == 'sqlite':
+        return SqliteStateBackend(file_path)
+    return JsonStateBackend(file_path)
+
+
+def load_state(file_path=None, types=None):
+    """Loads the current state from the configured backend.
+
+    ``types`` is a hint: backends that can (SQLite) load only those resource types.
+    """
+    return get_backend(file_path=file_path).load(types)
+
+
+def _resource_count(backend_name, file_path):
+    """Number of resources already stored at a state location (0 if there is none)."""
+    if backend_name == 'sqlite':
+        if not os.path.exists(file_path):
+            return 0
+        backend = SqliteStateBackend(file_path, read_only=True)
+        try:
+            return backend.count()
+        except sqlite3.OperationalError:
+            return 0  # Not a pyraform database yet
+        finally:
+            backend.close()
+    count = 0
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as file:
+            count = len(json.load(file).get('resources') or [])
+    journal_path = f"{file_path}.journal"
+    if os.path.exists(journal_path) and os.path.getsize(journal_path):
+        count += 1  # Unreplayed changes count as content
+    return count
+
+
+def migrate_state(target, json_path=None, sqlite_path=None, force=False):
+    """Copy state between state.json and SQLite. Returns the number of resources copied.
+
+    Paths default to the configured state location (see ``state_paths``). The
+    source must exist, and a target that already holds resources is only
+    overwritten with ``force``.
+    """
+    target = target.lower()
+    if target not in DEFAULT_STATE_FILES:
+        raise ValueError(f"Unsupported state backend: {target}")
+    paths = state_paths() if not (json_path and sqlite_path) else {}
+    json_path = json_path or paths['json']
+    sqlite_path = sqlite_path or paths['sqlite']
+    source_path, target_path = (json_path, sqlite_path) if target == 'sqlite' else (sqlite_path, json_path)
+    if not (os.path.exists(source_path) or (target == 'sqlite' and os.path.exists(f"{json_path}.journal"))):
+        raise FileNotFoundError(f"No state to migrate: {source_path} does not exist")
+    existing = _resource_count(target, target_path)
+    if existing and not force:
+        raise FileExistsError(f"{target_path} already holds state; use --force to overwrite it")
+
+    if target == 'sqlite':
+        state = JsonStateBackend(json_path).load()
+        SqliteStateBackend(sqlite_path).replace_all(state)
+    else:
+        source = SqliteStateBackend(sqlite_path, read_only=True)
+        try:
+            state = source.load()
+        finally:
+            source.close()
+        JsonStateBackend(json_path).compact(state)
+    logging.getLogger(__name__).info(f"Migrated {len(state)} resource(s) from {source_path} to {target_path}")
+    return len(state)
+
+def save_state(state, file_path=None):
+    """Compacts pending journal entries into the state snapshot.
+
+    Call at the end of a run; the snapshot is replaced atomically.
+    """
+    if file_path and file_path != state.file_path:
+        JsonStateBackend(file_path).compact(state)
+        return
+    with state.lock:
+        state.backend.compact(state)
+
 def update_state(state, resource, action):
     """Updates the state based on an action (create, update, delete).
 
@@ -20,23 +494,12 @@ def update_state(state, resource, action):
     - create: upsert by (name, type)
     - update: replace properties of existing (name, type)
     - delete: remove matching (name, type)
+
+    Large property values are moved into the state's blob store first. The
+    change is journaled; the snapshot is rewritten only on compaction.
     """
-    if action == "create":
-        updated = False
-        for i, res in enumerate(state.get("resources", [])):
-            if res.get("name") == resource.get("name") and res.get("type") == resource.get("type"):
-                state["resources"][i] = resource
-                updated = True
-                break
-        if not updated:
-            state.setdefault("resources", []).append(resource)
-    elif action == "update":
-        for res in state["resources"]:
-            if res["name"] == resource["name"] and res["type"] == resource["type"]:
-                res["properties"] = resource["properties"]
-    elif action == "delete":
-        state["resources"] = [
-            res for res in state["resources"] 
-            if not (res["name"] == resource["name"] and res["type"] == resource["type"])
-        ]
-    save_state(state)
+    with state.lock:
+        if action in ("create", "update") and resource.get('properties'):
+            resource = {**resource, 'properties': state.blobs.externalize(resource['properties'])}
+        _apply(state, resource, action)
+        state.backend.record(state, resource, action)
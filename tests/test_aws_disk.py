@@ -0,0 +1,50 @@
+from botocore.exceptions import ClientError, WaiterError
+
+from resources.aws.disk import create_and_attach_disks
+
+PROPS = {'size': 10, 'volume_type': 'gp3', 'availability_zone': 'us-east-1a', 'device_name': '/dev/sdf'}
+
+
+class StubWaiter:
+    def wait(self, VolumeIds):
+        raise WaiterError('VolumeAvailable', 'Max attempts exceeded', {})
+
+
+class StubEC2:
+    """create_volume succeeds, the waiter times out and describe_volumes is throttled."""
+
+    def __init__(self):
+        self.volumes = 0
+        self.attached = []
+
+    def create_volume(self, **kwargs):
+        self.volumes += 1
+        return {'VolumeId': f"vol-{self.volumes}"}
+
+    def get_waiter(self, name):
+        return StubWaiter()
+
+    def describe_volumes(self, VolumeIds):
+        raise ClientError({'Error': {'Code': 'RequestLimitExceeded', 'Message': 'slow down'}}, 'DescribeVolumes')
+
+    def attach_volume(self, VolumeId, InstanceId, Device):
+        self.attached.append(VolumeId)
+        return {}
+
+
+def test_created_volumes_are_reported_when_describe_fails():
+    client = StubEC2()
+    created = {}
+    attached = create_and_attach_disks(client, [('data', PROPS, 'i-1'), ('logs', PROPS, 'i-2')],
+                                       parallelism=1, created=created)
+    assert attached == {}
+    assert client.attached == []
+    assert created == {'data': 'vol-1', 'logs': 'vol-2'}
+
+
+def test_recorded_volumes_are_reused_instead_of_created():
+    client = StubEC2()
+    created = {}
+    create_and_attach_disks(client, [('data', {**PROPS, 'disk_id': 'vol-old'}, 'i-1')], parallelism=1, created=created)
+    assert client.volumes == 0
+    assert created == {'data': 'vol-old'}
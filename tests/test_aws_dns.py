@@ -0,0 +1,41 @@
+from resources.aws.dns import CHANGE_BATCH_LIMIT, _batches, diff_record_sets, record_key, record_set_from_properties
+
+
+def _record_set(name, values, ttl=300, record_type='A'):
+    return record_set_from_properties({'name': name, 'type': record_type, 'ttl': ttl, 'records': values})
+
+
+def test_diff_creates_upserts_and_deletes_only_managed_records():
+    current = {record_key(rs): rs for rs in [
+        _record_set('same.example.com', ['1.1.1.1']),
+        _record_set('changed.example.com', ['2.2.2.2']),
+        _record_set('stale.example.com', ['3.3.3.3']),
+        _record_set('manual.example.com', ['4.4.4.4']),
+    ]}
+    desired = [
+        _record_set('Same.example.com', ['1.1.1.1']),
+        _record_set('changed.example.com', ['2.2.2.2'], ttl=60),
+        _record_set('new.example.com', ['5.5.5.5']),
+    ]
+    changes = diff_record_sets(current, desired, managed=[record_key(_record_set('stale.example.com', []))])
+    assert [(c['Action'], c['ResourceRecordSet']['Name']) for c in changes] == [
+        ('UPSERT', 'changed.example.com.'),
+        ('CREATE', 'new.example.com.'),
+        ('DELETE', 'stale.example.com.'),
+    ]
+
+
+def test_value_order_does_not_cause_an_upsert():
+    current = {record_key(rs): rs for rs in [_record_set('www.example.com', ['1.1.1.1', '2.2.2.2'])]}
+    assert diff_record_sets(current, [_record_set('www.example.com', ['2.2.2.2', '1.1.1.1'])]) == []
+
+
+def test_batches_respect_the_record_value_limit():
+    changes = [{'Action': 'CREATE', 'ResourceRecordSet': _record_set(f"r{i}.example.com", ['1.1.1.1'])}
+               for i in range(CHANGE_BATCH_LIMIT + 1)]
+    assert [len(batch) for batch in _batches(changes)] == [CHANGE_BATCH_LIMIT, 1]
+
+    # An UPSERT counts twice
+    upserts = [{'Action': 'UPSERT', 'ResourceRecordSet': _record_set(f"r{i}.example.com", ['1.1.1.1'])}
+               for i in range(CHANGE_BATCH_LIMIT)]
+    assert [len(batch) for batch in _batches(upserts)] == [CHANGE_BATCH_LIMIT // 2, CHANGE_BATCH_LIMIT // 2]
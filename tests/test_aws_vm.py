@@ -0,0 +1,44 @@
+from botocore.exceptions import ClientError
+
+from resources.aws import vm
+from resources.aws.vm import CREATE_TAGS_ATTEMPTS, tag_instances
+
+
+def not_found():
+    return ClientError({'Error': {'Code': 'InvalidInstanceID.NotFound', 'Message': 'not yet'}}, 'CreateTags')
+
+
+class StubEC2:
+    """Fails create_tags with the queued errors before succeeding."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+
+    def create_tags(self, Resources, Tags):
+        self.calls.append((tuple(Resources), Tags[0]['Value']))
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+def test_not_found_is_retried_until_the_ids_are_visible(monkeypatch):
+    monkeypatch.setattr(vm.time, 'sleep', lambda seconds: None)
+    client = StubEC2([not_found(), not_found()])
+    assert tag_instances(client, [('web', 'i-1')], parallelism=1) == {}
+    assert len(client.calls) == 3
+
+
+def test_instances_still_untagged_after_the_last_attempt_are_returned(monkeypatch):
+    monkeypatch.setattr(vm.time, 'sleep', lambda seconds: None)
+    client = StubEC2([not_found() for _ in range(CREATE_TAGS_ATTEMPTS)])
+    untagged = tag_instances(client, [('web', 'i-1'), ('web', 'i-2')], parallelism=1)
+    assert set(untagged) == {'i-1', 'i-2'}
+    assert len(client.calls) == CREATE_TAGS_ATTEMPTS
+
+
+def test_other_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(vm.time, 'sleep', lambda seconds: None)
+    denied = ClientError({'Error': {'Code': 'UnauthorizedOperation', 'Message': 'no'}}, 'CreateTags')
+    client = StubEC2([denied])
+    assert set(tag_instances(client, [('web', 'i-1'), ('db', 'i-2')], parallelism=1)) == {'i-1'}
+    assert len(client.calls) == 2
@@ -0,0 +1,15 @@
+from config_loader import iter_resources
+
+
+def _fleets(resource):
+    return [(member['name'], member['fleet']) for member in iter_resources([resource])]
+
+
+def test_fleet_marker_is_the_name_without_placeholders():
+    assert _fleets({'type': 'droplet', 'name': 'web-${index}', 'count': 2}) == [('web-0', 'web'), ('web-1', 'web')]
+    assert _fleets({'type': 'droplet', 'name': '${each.key}-api', 'for_each': ['eu']}) == [('eu-api', 'api')]
+
+
+def test_fleet_marker_falls_back_to_explicit_fleet_and_type():
+    assert _fleets({'type': 'droplet', 'name': 'web', 'fleet': 'front', 'count': 1}) == [('web-0', 'front')]
+    assert _fleets({'type': 'droplet', 'name': '${index}', 'count': 1}) == [('0', 'droplet')]
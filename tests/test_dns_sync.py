@@ -0,0 +1,77 @@
+import threading
+
+from deployments.dns_sync import adopt, apply_diff, diff_records
+
+
+def _record(record_id, record_type, name, data, **fields):
+    return {'id': record_id, 'type': record_type, 'name': name, 'data': data, **fields}
+
+
+CURRENT = [
+    _record(1, 'A', '@', '1.1.1.1', ttl=300),
+    _record(2, 'CNAME', 'www', 'Example.com.', ttl=300),
+    _record(3, 'A', 'api', '2.2.2.2', ttl=300),
+    _record(4, 'A', 'old', '3.3.3.3', ttl=300),
+    _record(5, 'TXT', 'manual', 'keep me', ttl=300),
+]
+
+
+def test_records_are_matched_by_type_name_and_normalized_data():
+    desired = {
+        'apex': {'type': 'A', 'name': 'example.com', 'data': '1.1.1.1', 'ttl': 300},
+        'www': {'type': 'CNAME', 'name': 'www.example.com.', 'data': 'example.com', 'ttl': 60},
+        'api': {'type': 'A', 'name': 'api', 'data': '9.9.9.9'},
+        'new': {'type': 'A', 'name': 'new', 'data': '4.4.4.4'},
+    }
+    diff = diff_records('example.com', desired, CURRENT, known_ids={'api': 3}, managed_ids=[1, 2, 3, 4])
+    assert [(key, current['id']) for key, current in diff['unchanged']] == [('apex', 1)]
+    # www only changed its TTL; api changed its data but state remembers its ID
+    assert [(key, current['id']) for key, _, current in diff['update']] == [('www', 2), ('api', 3)]
+    assert [key for key, _ in diff['create']] == ['new']
+    # Only managed records that are no longer desired are deleted; 'manual' is never touched
+    assert [current['id'] for current in diff['delete']] == [4]
+
+
+def test_apply_diff_runs_every_write_and_reports_ids():
+    desired = {
+        'api': {'type': 'A', 'name': 'api', 'data': '9.9.9.9'},
+        'new': {'type': 'A', 'name': 'new', 'data': '4.4.4.4'},
+        'bad': {'type': 'A', 'name': 'bad', 'data': '5.5.5.5'},
+    }
+    diff = diff_records('example.com', desired, CURRENT, known_ids={'api': 3}, managed_ids=[4])
+    calls = []
+    lock = threading.Lock()
+
+    def create(record):
+        with lock:
+            calls.append(('create', record['name']))
+        if record['name'] == 'bad':
+            raise RuntimeError('rejected')
+        return 10
+
+    def update(record, current):
+        with lock:
+            calls.append(('update', current['id']))
+        return current['id']
+
+    def delete(current):
+        with lock:
+            calls.append(('delete', current['id']))
+
+    ids, deleted = apply_diff(diff, create, update, delete, parallelism=4)
+    assert sorted(calls, key=str) == sorted([('create', 'new'), ('create', 'bad'), ('update', 3), ('delete', 4)], key=str)
+    # The failed create is logged and left out of the IDs
+    assert ids == {'api': 3, 'new': 10}
+    assert deleted == [4]
+
+
+def test_adopt_records_existing_matches_without_writing():
+    desired = {
+        'apex': {'type': 'A', 'name': '@', 'data': '1.1.1.1'},
+        'www': {'type': 'CNAME', 'name': 'www', 'data': 'example.com', 'ttl': 60},
+        'new': {'type': 'A', 'name': 'new', 'data': '4.4.4.4'},
+    }
+    diff = diff_records('example.com', desired, CURRENT)
+    assert adopt(diff) == {'apex': 1, 'www': 2}
+    # Unmanaged records are never scheduled for deletion
+    assert diff['delete'] == []
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from resources import object_storage
+from resources.object_storage import DELETE_BATCH, empty_bucket, sync_options
+
+
+class StubPaginator:
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, Bucket, Prefix=''):
+        self.client.listed.append(self.operation)
+        keys = sorted(self.client.objects)
+        for start in range(0, len(keys), 1000):
+            page = keys[start:start + 1000]
+            with self.client.lock:
+                self.client.produced += len(page)
+                self.client.max_outstanding = max(self.client.max_outstanding,
+                                                  self.client.produced - self.client.deleted_count)
+            if self.operation == 'list_object_versions':
+                yield {'Versions': [{'Key': key, 'VersionId': 'v1'} for key in page]}
+            else:
+                yield {'Contents': [{'Key': key} for key in page]}
+
+
+class StubS3:
+    """In-memory stand-in for the parts of an S3 client that empty_bucket uses."""
+
+    def __init__(self, count, fail_once=(), delay=0.0):
+        self.objects = {f"key-{i:06d}" for i in range(count)}
+        self.fail_once = set(fail_once)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.listed = []
+        self.batch_sizes = []
+        self.produced = 0
+        self.deleted_count = 0
+        self.max_outstanding = 0
+        self.active = 0
+        self.max_active = 0
+
+    def get_paginator(self, operation):
+        return StubPaginator(self, operation)
+
+    def delete_objects(self, Bucket, Delete):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.batch_sizes.append(len(Delete['Objects']))
+        time.sleep(self.delay)
+        errors = []
+        with self.lock:
+            for obj in Delete['Objects']:
+                if obj['Key'] in self.fail_once:
+                    self.fail_once.discard(obj['Key'])
+                    errors.append({'Key': obj['Key'], 'VersionId': obj.get('VersionId'), 'Code': 'SlowDown'})
+                else:
+                    self.objects.discard(obj['Key'])
+                    self.deleted_count += 1
+            self.active -= 1
+        return {'Errors': errors} if errors else {}
+
+
+def test_deletes_in_full_batches():
+    s3 = StubS3(2500)
+    stats = empty_bucket(s3, 'bucket', versions=False, parallelism=4)
+    assert sorted(s3.batch_sizes) == [500, DELETE_BATCH, DELETE_BATCH]
+    assert stats['deleted'] == 2500 and stats['failed'] == 0
+    assert stats['keys_per_sec'] > 0
+    assert not s3.objects
+
+
+def test_versioned_buckets_are_listed_by_version_only():
+    s3 = StubS3(1500)
+    stats = empty_bucket(s3, 'bucket', versions=True, parallelism=2)
+    assert s3.listed == ['list_object_versions']
+    assert len(s3.batch_sizes) == 2
+    assert stats['deleted'] == 1500
+
+
+def test_keys_reported_in_errors_are_retried(monkeypatch):
+    monkeypatch.setattr(object_storage.random, 'uniform', lambda low, high: 0)
+    s3 = StubS3(1200, fail_once={'key-000003', 'key-001100'})
+    stats = empty_bucket(s3, 'bucket', versions=False, parallelism=2)
+    assert stats['deleted'] == 1200 and stats['failed'] == 0
+    assert sorted(s3.batch_sizes).count(1) == 2
+    assert not s3.objects
+
+
+def test_keys_that_keep_failing_are_counted(monkeypatch):
+    monkeypatch.setattr(object_storage.random, 'uniform', lambda low, high: 0)
+    s3 = StubS3(10)
+    s3.fail_once = set(s3.objects)
+    original = s3.delete_objects
+
+    def always_fail(Bucket, Delete):
+        s3.fail_once.update(obj['Key'] for obj in Delete['Objects'])
+        return original(Bucket, Delete)
+
+    s3.delete_objects = always_fail
+    stats = empty_bucket(s3, 'bucket', versions=False, parallelism=1, max_retries=2)
+    assert stats['deleted'] == 0 and stats['failed'] == 10
+    assert len(s3.batch_sizes) == 3
+
+
+def test_listing_stays_bounded_by_batches_in_flight():
+    workers = 2
+    s3 = StubS3(20000, delay=0.01)
+    empty_bucket(s3, 'bucket', versions=False, parallelism=workers)
+    assert s3.max_active <= workers
+    # Two batches per worker may be queued, plus the page being assembled
+    assert s3.max_outstanding <= (workers * 2 + 1) * DELETE_BATCH
+    assert not s3.objects
+
+
+def test_sync_options_reject_a_missing_source(tmp_path):
+    with pytest.raises(ValueError):
+        sync_options({'prefix': 'site'})
+    with pytest.raises(ValueError):
+        sync_options(str(tmp_path / 'missing'))
+    assert sync_options({'source': str(tmp_path), 'prefix': '/site'}) == {
+        'source': str(tmp_path), 'prefix': 'site/', 'delete': False, 'acl': None}
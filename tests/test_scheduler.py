@@ -0,0 +1,82 @@
+import threading
+
+from deployments.scheduler import build_graph, build_state_graph, run_graph
+from state.state_manager import State, update_state
+
+
+def _state(tmp_path):
+    return State(file_path=str(tmp_path / 'state.json'))
+
+
+def test_large_reference_lists_stay_inline_and_keep_their_edges(tmp_path):
+    state = _state(tmp_path)
+    names = [f"web-{i:03d}" for i in range(250)]
+    for i, name in enumerate(names):
+        update_state(state, {'type': 'vultr_instance', 'name': name, 'properties': {'instance_id': f"i-{i}"}}, 'create')
+        update_state(state, {'type': 'droplet', 'name': f"do-{name}", 'properties': {'droplet_id': 1000 + i}}, 'create')
+    update_state(state, {'type': 'vultr_vpc', 'name': 'net', 'properties': {'vpc_id': 'v-1', 'instances': names}}, 'create')
+    update_state(state, {'type': 'firewall', 'name': 'fw', 'properties': {
+        'firewall_id': 'f-1', 'droplet_ids': [1000 + i for i in range(250)]}}, 'create')
+
+    vpc = state.find('net', 'vultr_vpc')
+    firewall = state.find('fw', 'firewall')
+    assert vpc['properties']['instances'] == names
+    assert len(firewall['properties']['droplet_ids']) == 250
+
+    resources = state.resources
+    deps = build_state_graph(state, resources)
+    assert len(deps[resources.index(vpc)]) == 250
+    assert len(deps[resources.index(firewall)]) == 250
+
+
+def test_other_large_properties_still_go_to_the_blob_store(tmp_path):
+    state = _state(tmp_path)
+    update_state(state, {'type': 'droplet', 'name': 'web', 'properties': {'droplet_id': 1, 'user_data': 'x' * 4096}}, 'create')
+    assert set(state.find('web', 'droplet')['properties']['user_data']) == {'$blob'}
+
+
+def _res(name, **properties):
+    return {'type': 'instance', 'name': name, 'properties': properties}
+
+
+def test_dependents_of_a_failed_item_are_skipped_transitively():
+    items = [_res('net'), _res('web', vpc='net'), _res('lb', instances=['web']), _res('dns')]
+    applied = []
+    lock = threading.Lock()
+
+    def apply(res):
+        with lock:
+            applied.append(res['name'])
+        if res['name'] == 'net':
+            raise RuntimeError('boom')
+
+    failed, skipped = run_graph(items, build_graph(items), apply, parallelism=2)
+    assert sorted(applied) == ['dns', 'net']
+    assert [res['name'] for res in failed] == ['net']
+    assert [res['name'] for res in skipped] == ['web', 'lb']
+
+
+def test_check_marks_items_as_failed():
+    items = [_res('net'), _res('web', vpc='net')]
+    failed, skipped = run_graph(items, build_graph(items), lambda res: None, parallelism=1,
+                                check=lambda res: res['name'] != 'net')
+    assert [res['name'] for res in failed] == ['net']
+    assert [res['name'] for res in skipped] == ['web']
+
+
+def test_firewall_membership_is_applied_after_its_instances():
+    items = [_res('fw', instances=['web']), _res('web', firewall='fw')]
+    deps = build_graph(items)
+    assert deps == [{1}, set()]
+    order = []
+    run_graph(items, deps, lambda res: order.append(res['name']), parallelism=1)
+    assert order == ['web', 'fw']
+
+
+def test_cycles_are_logged_and_broken_at_their_first_member(caplog):
+    items = [_res('a', attach_to='b'), _res('b', attach_to='a'), _res('c', attach_to='a')]
+    order = []
+    failed, skipped = run_graph(items, build_graph(items), lambda res: order.append(res['name']), parallelism=1)
+    assert order == ['a', 'b', 'c']
+    assert (failed, skipped) == ([], [])
+    assert 'Dependency cycle: a -> b -> a' in caplog.text
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from state import state_manager
+from state.state_manager import JsonStateBackend, SqliteStateBackend, State, migrate_state, state_paths, update_state
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    values = {}
+    monkeypatch.delenv('PYRAFORM_STATE_BACKEND', raising=False)
+    monkeypatch.setattr(state_manager, '_user_settings', lambda: values)
+    return values
+
+
+def _seed_json(path):
+    state = State(file_path=str(path))
+    state.upsert({'type': 'droplet', 'name': 'web', 'properties': {'droplet_id': 1}})
+    JsonStateBackend(str(path)).compact(state)
+
+
+def test_state_paths_default_to_state_json_and_db(settings):
+    assert state_paths() == {'json': 'state.json', 'sqlite': 'state.db'}
+
+
+def test_migrate_state_follows_a_custom_state_file(settings, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source = tmp_path / 'prod' / 'infra.json'
+    source.parent.mkdir()
+    _seed_json(source)
+    settings['state_file'] = str(source)
+
+    assert state_paths()['sqlite'] == str(tmp_path / 'prod' / 'infra.db')
+    assert migrate_state('sqlite') == 1
+    migrated = SqliteStateBackend(str(tmp_path / 'prod' / 'infra.db')).load()
+    assert migrated.id_of('web', 'droplet', 'droplet_id') == 1
+    assert not os.path.exists('state.db')
+
+
+def test_migrate_back_to_json_reads_the_configured_sqlite_file(settings, tmp_path):
+    json_path = tmp_path / 'seed.json'
+    _seed_json(json_path)
+    db_path = tmp_path / 'custom.db'
+    SqliteStateBackend(str(db_path)).replace_all(JsonStateBackend(str(json_path)).load())
+    settings.update({'state_backend': 'sqlite', 'state_file': str(db_path)})
+
+    assert migrate_state('json') == 1
+    assert JsonStateBackend(str(tmp_path / 'custom.json')).load().find('web', 'droplet')
+
+
+def test_large_tag_lists_read_back_through_the_blob_store(tmp_path):
+    state = State(file_path=str(tmp_path / 'state.json'))
+    tags = [f"team-{i:03d}" for i in range(200)]
+    update_state(state, {'type': 'droplet', 'name': 'web', 'properties': {'droplet_id': 1, 'tags': tags}}, 'create')
+    stored = state.find('web', 'droplet')['properties']['tags']
+    assert set(stored) == {'$blob'}
+    assert state.blobs.resolve(stored) == tags
+
+
+def test_migrate_to_json_refuses_a_missing_database(settings, tmp_path):
+    json_path = tmp_path / 'state.json'
+    _seed_json(json_path)
+    db_path = tmp_path / 'state.db'
+
+    with pytest.raises(FileNotFoundError):
+        migrate_state('json', json_path=str(json_path), sqlite_path=str(db_path))
+    assert not db_path.exists()
+    assert JsonStateBackend(str(json_path)).load().find('web', 'droplet')
+
+
+def test_migrate_to_sqlite_refuses_a_missing_json_file(settings, tmp_path):
+    db_path = tmp_path / 'state.db'
+    seed = tmp_path / 'seed.json'
+    _seed_json(seed)
+    SqliteStateBackend(str(db_path)).replace_all(JsonStateBackend(str(seed)).load())
+
+    with pytest.raises(FileNotFoundError):
+        migrate_state('sqlite', json_path=str(tmp_path / 'missing.json'), sqlite_path=str(db_path))
+    assert SqliteStateBackend(str(db_path)).count() == 1
+
+
+@pytest.mark.parametrize('target', ['json', 'sqlite'])
+def test_migrate_state_only_overwrites_existing_state_with_force(settings, tmp_path, target):
+    json_path = tmp_path / 'state.json'
+    db_path = tmp_path / 'state.db'
+    _seed_json(json_path)
+    SqliteStateBackend(str(db_path)).replace_all(JsonStateBackend(str(json_path)).load())
+
+    with pytest.raises(FileExistsError):
+        migrate_state(target, json_path=str(json_path), sqlite_path=str(db_path))
+    assert migrate_state(target, json_path=str(json_path), sqlite_path=str(db_path), force=True) == 1
+
+
+def _journaled_state(tmp_path, compact_every=500):
+    path = str(tmp_path / 'state.json')
+    return State(file_path=path, backend=JsonStateBackend(path, compact_every=compact_every)), path
+
+
+def test_journaled_changes_are_replayed_after_a_crash(tmp_path):
+    state, path = _journaled_state(tmp_path)
+    update_state(state, {'type': 'droplet', 'name': 'web', 'properties': {'droplet_id': 1}}, 'create')
+    update_state(state, {'type': 'droplet', 'name': 'db', 'properties': {'droplet_id': 2}}, 'create')
+    update_state(state, {'type': 'droplet', 'name': 'web', 'properties': {}}, 'delete')
+    # No compaction: only the journal exists, as after a killed run
+    assert not os.path.exists(path)
+
+    loaded = JsonStateBackend(path).load()
+    assert [res['name'] for res in loaded.resources] == ['db']
+    # Loading compacts the replayed changes into the snapshot
+    assert os.path.exists(path)
+    assert not os.path.exists(f"{path}.journal")
+
+
+def test_a_torn_journal_tail_is_ignored(tmp_path):
+    state, path = _journaled_state(tmp_path)
+    update_state(state, {'type': 'droplet', 'name': 'web', 'properties': {'droplet_id': 1}}, 'create')
+    with open(f"{path}.journal", 'a') as journal:
+        journal.write('{"action":"create","resource":{"type":"dro')
+
+    loaded = JsonStateBackend(path).load()
+    assert [res['name'] for res in loaded.resources] == ['web']
+
+
+def test_the_journal_is_compacted_every_compact_every_changes(tmp_path):
+    state, path = _journaled_state(tmp_path, compact_every=2)
+    update_state(state, {'type': 'droplet', 'name': 'web', 'properties': {'droplet_id': 1}}, 'create')
+    assert not os.path.exists(path)
+    update_state(state, {'type': 'droplet', 'name': 'db', 'properties': {'droplet_id': 2}}, 'create')
+    assert not os.path.exists(f"{path}.journal")
+    assert [res['name'] for res in JsonStateBackend(path).load().resources] == ['web', 'db']
@@ -0,0 +1,61 @@
+from resources.digitalocean import tags
+from resources.digitalocean.tags import TagBatcher
+
+
+class StubTag:
+    """Records every call; tags named in ``failing`` reject droplet changes."""
+
+    calls = []
+    failing = set()
+
+    def __init__(self, token, name):
+        self.name = name
+
+    def create(self):
+        self.calls.append(('create', self.name, None))
+
+    def add_droplets(self, droplet_ids):
+        self.calls.append(('add', self.name, droplet_ids))
+        if self.name in self.failing:
+            raise RuntimeError('rejected')
+
+    def remove_droplets(self, droplet_ids):
+        self.calls.append(('remove', self.name, droplet_ids))
+        if self.name in self.failing:
+            raise RuntimeError('rejected')
+
+
+def _batcher(monkeypatch, failing=()):
+    StubTag.calls = []
+    StubTag.failing = set(failing)
+    monkeypatch.setattr(tags.digitalocean, 'Tag', StubTag)
+    return TagBatcher('token')
+
+
+def test_changes_are_batched_into_one_call_per_tag(monkeypatch):
+    batcher = _batcher(monkeypatch)
+    for droplet_id in (3, 1, 2):
+        batcher.add('web', droplet_id)
+        batcher.remove('old', droplet_id)
+    batcher.add('old', 2)
+
+    stats = batcher.flush()
+    assert StubTag.calls == [
+        ('create', 'old', None), ('add', 'old', [2]),
+        ('create', 'web', None), ('add', 'web', [1, 2, 3]),
+        ('remove', 'old', [1, 3]),
+    ]
+    assert stats == {'calls': 5, 'applied': 3, 'failed': 0, 'failures': []}
+    assert batcher.pending() == 0
+
+
+def test_failures_are_counted_and_returned(monkeypatch):
+    batcher = _batcher(monkeypatch, failing={'db'})
+    batcher.add('web', 1)
+    batcher.add('db', 1)
+    batcher.remove('db', 2)
+
+    stats = batcher.flush()
+    assert stats['applied'] == 1
+    assert stats['failed'] == 2
+    assert stats['failures'] == [('add', 'db', [1]), ('remove', 'db', [2])]
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from providers import vultr
+from providers.vultr import VultrProvider
+
+
+class StubResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = json.dumps(body) if body is not None else ''
+        self.ok = status_code < 400
+        self._body = body
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class StubSession:
+    """Replays queued responses and records (method, url, params) for every request."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, timeout=None, params=None, **kwargs):
+        self.requests.append((method, url, dict(params or {})))
+        return self.responses.pop(0)
+
+
+def _provider(responses, **kwargs):
+    vp = VultrProvider('key', **kwargs)
+    vp.session = StubSession(responses)
+    return vp
+
+
+def _page(items, cursor=''):
+    return StubResponse(body={'instances': items, 'meta': {'links': {'next': cursor}}})
+
+
+def test_pagination_follows_next_cursors():
+    vp = _provider([_page([{'id': 1}, {'id': 2}], 'c2'), _page([{'id': 3}], 'c3'), _page([])], per_page=2)
+    assert [ins['id'] for ins in vp.iter_instances()] == [1, 2, 3]
+    assert [params for _, _, params in vp.session.requests] == [
+        {'per_page': 2}, {'per_page': 2, 'cursor': 'c2'}, {'per_page': 2, 'cursor': 'c3'}]
+
+
+def test_pagination_is_lazy():
+    vp = _provider([_page([{'id': 1}], 'c2'), _page([{'id': 2}])])
+    instances = vp.iter_instances()
+    assert next(instances) == {'id': 1}
+    assert len(vp.session.requests) == 1
+
+
+def _no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(vultr.time, 'sleep', slept.append)
+    return slept
+
+
+def test_throttled_requests_wait_for_retry_after(monkeypatch):
+    slept = _no_sleep(monkeypatch)
+    vp = _provider([StubResponse(429, headers={'Retry-After': '3'}), StubResponse(body={'instance': {'id': 1}})])
+    assert vp.create_instance(region='ewr', plan='vc2-1c-1gb', os_id=1, label='web') == {'id': 1}
+    assert slept == [3.0]
+    assert vp.request_stats()['throttled'] == 1
+
+
+def test_server_errors_are_retried_with_backoff_for_idempotent_verbs(monkeypatch):
+    slept = _no_sleep(monkeypatch)
+    vp = _provider([StubResponse(503), StubResponse(502), StubResponse(204)], backoff_base=1, backoff_max=4)
+    vp.delete_instance('i-1')
+    assert len(vp.session.requests) == 3
+    assert len(slept) == 2 and slept[0] <= 1 and slept[1] <= 2
+
+
+def test_server_errors_are_not_retried_for_post(monkeypatch):
+    slept = _no_sleep(monkeypatch)
+    vp = _provider([StubResponse(503, body={'error': 'unavailable'})])
+    with pytest.raises(RuntimeError):
+        vp.create_instance(region='ewr', plan='vc2-1c-1gb', os_id=1, label='web')
+    assert len(vp.session.requests) == 1
+    assert slept == []
+
+
+def test_retries_stop_after_max_retries(monkeypatch):
+    _no_sleep(monkeypatch)
+    vp = _provider([StubResponse(503) for _ in range(3)], max_retries=2)
+    with pytest.raises(RuntimeError):
+        vp.delete_instance('i-1')
+    assert len(vp.session.requests) == 3